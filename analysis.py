@@ -1,11 +1,22 @@
 import json
+import os
 import numpy as np
 from typing import Dict, List
 import matplotlib.pyplot as plt
 
+from training_log import iter_records
+
 
 def load_data(filename: str) -> dict:
-    """load training results and compute max_score."""
+    """load training results and compute max_score, streamed from the episode log (.jsonl) if there is one."""
+    if os.path.exists(f"data/{filename}.jsonl"):
+        training_state = {'episodes': [], 'scores': [], 'max_scores': []}
+        for record in iter_records(f"data/{filename}.jsonl"):
+            training_state['episodes'].append(record['episode'])
+            training_state['scores'].append(record['score'])
+            training_state['max_scores'].append(record['max_score'])
+        return training_state
+
     with open(f"data/{filename}.json", "r") as f:
         training_state = json.load(f)
     max_reached = 0
@@ -0,0 +1,207 @@
+"""
+Pixel perfect collision between sprites.
+
+Hitmasks are packed as a tuple of integers, one per row of the image, with bit x set when pixel x of that
+row is opaque. Testing two masks for overlap is then one shifted AND per overlapping row instead of a
+Python loop over every overlapping pixel.
+"""
+import hashlib
+import mmap
+import os
+import struct
+
+import pygame
+
+# Directory for precomputed collision data, alongside the sprites it is derived from
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "cache")
+# Cached hitmask file header: width, height and bytes per packed row, followed by the rows little endian
+HITMASK_HEADER = "<HHH"
+
+
+def loadSprite(path, headless=False, alpha=True):
+    """
+    Returns a sprite converted for fast blitting.
+    :param path: path of the sprite image
+    :param headless: no display mode is set, convert_alpha needs one so the sprite is blitted onto a per-pixel alpha
+        surface instead, colorkey pixels become transparent exactly as they would be
+    :param alpha: keep per-pixel alpha, only used with a display
+    """
+    image = pygame.image.load(path)
+    if not headless:
+        return image.convert_alpha() if alpha else image.convert()
+    surface = pygame.Surface(image.get_size(), pygame.SRCALPHA, 32)
+    surface.blit(image, (0, 0))
+    return surface
+
+
+def getHitmask(image):
+    """Returns a hitmask using an image's alpha."""
+    mask = []
+    for y in range(image.get_height()):
+        row = 0
+        for x in range(image.get_width()):
+            if image.get_at((x, y))[3]:
+                row |= 1 << x
+        mask.append(row)
+    return tuple(mask)
+
+
+def loadHitmask(path, cacheDir=CACHE_DIR):
+    """
+    Returns the hitmask of a sprite file, cached on disk so pixels are only read once per sprite.
+    :param path: path of the sprite image
+    :param cacheDir: directory to cache hitmasks in, None to always compute
+    """
+    with open(path, "rb") as f:
+        key = hashlib.sha1(f.read()).hexdigest()
+    cachePath = os.path.join(cacheDir, f"hitmask-{key}.bin") if cacheDir else None
+
+    if cachePath and os.path.exists(cachePath):
+        mask = readHitmask(cachePath)
+        if mask is not None:
+            return mask
+
+    surface = loadSprite(path, headless=True)
+    mask = getHitmask(surface)
+    if cachePath:
+        width, height = surface.get_size()
+        rowBytes = (width + 7) // 8
+        writeCache(
+            cachePath,
+            struct.pack(HITMASK_HEADER, width, height, rowBytes)
+            + b"".join(row.to_bytes(rowBytes, "little") for row in mask),
+        )
+    return mask
+
+
+def readHitmask(cachePath):
+    """Returns the hitmask in a cache file, None if the file is not a complete hitmask."""
+    start = struct.calcsize(HITMASK_HEADER)
+    with open(cachePath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < start:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            _, height, rowBytes = struct.unpack_from(HITMASK_HEADER, buf)
+            if size != start + height * rowBytes:
+                return None
+            return tuple(
+                int.from_bytes(buf[i : i + rowBytes], "little")
+                for i in range(start, start + height * rowBytes, rowBytes)
+            )
+
+
+def writeCache(cachePath, data):
+    """
+    Write a cache file next to cachePath and then move it over cachePath, so processes building the same cache at
+    once never read a partly written file.
+    """
+    tmpPath = f"{cachePath}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        with open(tmpPath, "wb") as f:
+            f.write(data)
+        os.replace(tmpPath, cachePath)
+    except OSError:
+        pass  # read only assets, keep the data in memory only
+
+
+def flipHitmask(hitmask, width, xbool, ybool):
+    """Returns the hitmask of an image flipped like pygame.transform.flip(image, xbool, ybool)."""
+    rows = tuple(reversed(hitmask)) if ybool else tuple(hitmask)
+    if xbool:
+        rows = tuple(int(format(row, f"0{width}b")[::-1], 2) for row in rows)
+    return rows
+
+
+def pixelCollision(rect1, rect2, hitmask1, hitmask2):
+    """Checks if two objects collide and not just their rects"""
+    rect = rect1.clip(rect2)
+
+    if rect.width == 0 or rect.height == 0:
+        return False
+
+    x1, y1 = rect.x - rect1.x, rect.y - rect1.y
+    x2, y2 = rect.x - rect2.x, rect.y - rect2.y
+
+    # Shifting both rows to the left edge of the clipped rect lines up the overlapping pixels, bits past
+    # the clipped width are always zero in the row of whichever rect ends first so no extra mask is needed
+    for y in range(rect.height):
+        if (hitmask1[y1 + y] >> x1) & (hitmask2[y2 + y] >> x2):
+            return True
+    return False
+
+
+class CollisionTable:
+    """
+    Precomputed pixel collisions between two hitmasks for every integer offset of the second rect from the
+    first. Sprites never change during a run so a crash test becomes a single table lookup.
+
+    Tables are cached to disk keyed by a hash of both hitmasks, so each sprite pair is only built once.
+    """
+
+    def __init__(self, hitmask1, size1, hitmask2, size2, cacheDir=CACHE_DIR):
+        """
+        Load or build the table.
+        :param hitmask1: packed hitmask of the first sprite (the player)
+        :param size1: (width, height) of the first sprite
+        :param hitmask2: packed hitmask of the second sprite (a pipe)
+        :param size2: (width, height) of the second sprite
+        :param cacheDir: directory to cache tables in, None to always build
+        """
+        self.dx0, self.dy0 = size2[0] - 1, size2[1] - 1
+        self.width = size1[0] + size2[0] - 1  # number of dx offsets where the rects overlap
+        self.height = size1[1] + size2[1] - 1  # number of dy offsets where the rects overlap
+
+        key = hashlib.sha1(repr((size1, hitmask1, size2, hitmask2)).encode()).hexdigest()
+        path = os.path.join(cacheDir, f"collision-{key}.bin") if cacheDir else None
+        self.table = None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                self.table = f.read()
+            if len(self.table) != self.width * self.height:
+                self.table = None
+        if self.table is None:
+            self.table = self._build(hitmask1, size1, hitmask2, size2)
+            if path:
+                writeCache(path, self.table)
+
+    def _build(self, hitmask1, size1, hitmask2, size2):
+        """Returns the table as bytes, entry [(dx + dx0) * height + dy + dy0] is 1 if the masks overlap."""
+        h1, h2 = size1[1], size2[1]
+        table = bytearray(self.width * self.height)
+        for i in range(self.width):
+            dx = i - self.dx0
+            # line up the overlapping columns, the same shift pixelCollision does for the clipped rect
+            rows1 = [row >> max(0, dx) for row in hitmask1]
+            rows2 = [row >> max(0, -dx) for row in hitmask2]
+            for j in range(self.height):
+                dy = j - self.dy0
+                for y in range(max(0, dy), min(h1, dy + h2)):
+                    if rows1[y] & rows2[y - dy]:
+                        table[i * self.height + j] = 1
+                        break
+        return bytes(table)
+
+    def collides(self, dx, dy):
+        """Checks if the sprites collide with the second at integer offset (dx, dy) from the first."""
+        i, j = dx + self.dx0, dy + self.dy0
+        if 0 <= i < self.width and 0 <= j < self.height:
+            return self.table[i * self.height + j] == 1
+        return False
+
+
+def getCollisionTables(IMAGES, HITMASKS):
+    """
+    Returns (upper pipe, lower pipe) collision tables for every player frame.
+    :param IMAGES: images dict with 'player' and 'pipe' sprites
+    :param HITMASKS: hitmasks dict matching IMAGES
+    """
+    pipeSize = IMAGES["pipe"][0].get_size()
+    return tuple(
+        (
+            CollisionTable(pHitmask, pImage.get_size(), HITMASKS["pipe"][0], pipeSize),
+            CollisionTable(pHitmask, pImage.get_size(), HITMASKS["pipe"][1], pipeSize),
+        )
+        for pImage, pHitmask in zip(IMAGES["player"], HITMASKS["player"])
+    )
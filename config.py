@@ -1,6 +1,12 @@
 config = {'train': False,  # train or run the model
           'show_game': True,  # when training/evaluating it is much faster to not display the game graphics
+          'headless': False,  # no display, event polling or frame clock at all, for servers (or --headless)
           'print_score': 10000,  # print when a multiple of this score is reached
           'max_score': 10000000,  # end the episode and update q-table when reaching this score
           'resume_score': 100000,  # if dies above this score, resume training from this difficult segment
+          'scenario_bank': None,  # file of hard scenarios kept across runs and processes, e.g. 'data/scenarios.bin'
+          'scenario_chance': 0.5,  # chance a training game starts from a scenario of the bank instead of the start
+          'online': False,  # update the q-table every frame rather than at death, memory stays flat for long episodes
+          'prioritized_replay': 0,  # transitions in a prioritized replay of failed resume attempts, 0 for none
+          'q_lambda': 0,  # trace decay of a Q(lambda) agent trained in the same way, 0 for the Q-learning agent
           }
@@ -5,6 +5,9 @@ import pygame
 import os
 from pygame.locals import *
 
+from collision import flipHitmask, getCollisionTables, loadHitmask, loadSprite
+from pipes import PipeRing
+
 FPS = 30
 SCREENWIDTH = 288
 SCREENHEIGHT = 512
@@ -13,6 +16,15 @@ BASEY = SCREENHEIGHT * 0.79
 
 ASSETS_PATH = os.path.join(os.path.dirname(__file__), "assets")
 
+# Order of the observation written by FlappyGame.observe, matches the keys of FlappyGame._get_state
+STATE_FEATURES = (
+    "player_y",
+    "player_vel",
+    "next_pipe_dist_to_player",
+    "next_pipe_top_y",
+    "next_pipe_bottom_y",
+)
+
 try:
     xrange
 except NameError:
@@ -20,18 +32,32 @@ except NameError:
 
 
 class FlappyGame:
-    def __init__(self):
-        pygame.init()
-        self.FPSCLOCK = pygame.time.Clock()
-        self.SCREEN = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
-        pygame.display.set_caption("Flappy Bird")
+    def __init__(self, headless=False):
+        """
+        Initialise the game.
+        :param headless: never open a window or the audio mixer and skip event pumping, drawing and sounds
+        """
+        self.headless = headless
+        if headless:
+            self.FPSCLOCK = None
+            self.SCREEN = None
+        else:
+            pygame.init()
+            self.FPSCLOCK = pygame.time.Clock()
+            self.SCREEN = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
+            pygame.display.set_caption("Flappy Bird")
 
         self.IMAGES, self.SOUNDS, self.HITMASKS = self.load_assets()
+        self.COLLISIONS = getCollisionTables(self.IMAGES, self.HITMASKS)
+        self.pipes = PipeRing()
         self.reset()
 
     def load_assets(self):
         IMAGES, SOUNDS, HITMASKS = {}, {}, {}
 
+        def loadImage(path, alpha=True):
+            return loadSprite(os.path.join(ASSETS_PATH, path), self.headless, alpha)
+
         PLAYERS_LIST = (
             (
                 "assets/sprites/redbird-upflap.png",
@@ -57,91 +83,55 @@ class FlappyGame:
         PIPES_LIST = ("assets/sprites/pipe-green.png", "assets/sprites/pipe-red.png")
 
         # numbers sprites for score display
-        IMAGES["numbers"] = tuple(
-            [
-                pygame.image.load(
-                    os.path.join(ASSETS_PATH, f"sprites/{i}.png")
-                ).convert_alpha()
-                for i in range(10)
-            ]
-        )
+        IMAGES["numbers"] = tuple([loadImage(f"sprites/{i}.png") for i in range(10)])
 
-        IMAGES["gameover"] = pygame.image.load(
-            os.path.join(ASSETS_PATH, "sprites/gameover.png")
-        ).convert_alpha()
-        IMAGES["message"] = pygame.image.load(
-            os.path.join(ASSETS_PATH, "sprites/message.png")
-        ).convert_alpha()
-        IMAGES["base"] = pygame.image.load(
-            os.path.join(ASSETS_PATH, "sprites/base.png")
-        ).convert_alpha()
+        IMAGES["gameover"] = loadImage("sprites/gameover.png")
+        IMAGES["message"] = loadImage("sprites/message.png")
+        IMAGES["base"] = loadImage("sprites/base.png")
 
         if "win" in sys.platform:
             soundExt = ".wav"
         else:
             soundExt = ".ogg"
 
-        SOUNDS["die"] = pygame.mixer.Sound(
-            os.path.join(ASSETS_PATH, "audio/die" + soundExt)
-        )
-        SOUNDS["hit"] = pygame.mixer.Sound(
-            os.path.join(ASSETS_PATH, "audio/hit" + soundExt)
-        )
-        SOUNDS["point"] = pygame.mixer.Sound(
-            os.path.join(ASSETS_PATH, "audio/point" + soundExt)
-        )
-        SOUNDS["swoosh"] = pygame.mixer.Sound(
-            os.path.join(ASSETS_PATH, "audio/swoosh" + soundExt)
-        )
-        SOUNDS["wing"] = pygame.mixer.Sound(
-            os.path.join(ASSETS_PATH, "audio/wing" + soundExt)
-        )
+        # Headless games never touch the mixer, sounds are left out and skipped on play
+        if not self.headless:
+            for name in ("die", "hit", "point", "swoosh", "wing"):
+                SOUNDS[name] = pygame.mixer.Sound(
+                    os.path.join(ASSETS_PATH, "audio/" + name + soundExt)
+                )
 
         randBg = random.randint(0, len(BACKGROUNDS_LIST) - 1)
-        IMAGES["background"] = pygame.image.load(
-            os.path.join(ASSETS_PATH, BACKGROUNDS_LIST[randBg][len("assets/") :])
-        ).convert()
+        IMAGES["background"] = loadImage(
+            BACKGROUNDS_LIST[randBg][len("assets/") :], alpha=False
+        )
 
         randPlayer = random.randint(0, len(PLAYERS_LIST) - 1)
         IMAGES["player"] = tuple(
-            [
-                pygame.image.load(
-                    os.path.join(ASSETS_PATH, p[len("assets/") :])
-                ).convert_alpha()
-                for p in PLAYERS_LIST[randPlayer]
-            ]
+            [loadImage(p[len("assets/") :]) for p in PLAYERS_LIST[randPlayer]]
         )
 
         pipeindex = random.randint(0, len(PIPES_LIST) - 1)
         IMAGES["pipe"] = (
             pygame.transform.flip(
-                pygame.image.load(
-                    os.path.join(ASSETS_PATH, PIPES_LIST[pipeindex][len("assets/") :])
-                ).convert_alpha(),
-                False,
-                True,
+                loadImage(PIPES_LIST[pipeindex][len("assets/") :]), False, True
             ),
-            pygame.image.load(
-                os.path.join(ASSETS_PATH, PIPES_LIST[pipeindex][len("assets/") :])
-            ).convert_alpha(),
+            loadImage(PIPES_LIST[pipeindex][len("assets/") :]),
         )
 
-        def getHitmask(image):
-            mask = []
-            for x in xrange(image.get_width()):
-                mask.append([])
-                for y in xrange(image.get_height()):
-                    mask[x].append(bool(image.get_at((x, y))[3]))
-            return mask
-
+        # Hitmasks are cached per sprite file, the upper pipe mask is the flipped file mask
+        pipeHitmask = loadHitmask(
+            os.path.join(ASSETS_PATH, PIPES_LIST[pipeindex][len("assets/") :])
+        )
         HITMASKS["pipe"] = (
-            getHitmask(IMAGES["pipe"][0]),
-            getHitmask(IMAGES["pipe"][1]),
+            flipHitmask(pipeHitmask, IMAGES["pipe"][1].get_width(), False, True),
+            pipeHitmask,
         )
-        HITMASKS["player"] = (
-            getHitmask(IMAGES["player"][0]),
-            getHitmask(IMAGES["player"][1]),
-            getHitmask(IMAGES["player"][2]),
+        HITMASKS["player"] = tuple(
+            [
+                loadHitmask(os.path.join(ASSETS_PATH, p[len("assets/") :]))
+                for p in PLAYERS_LIST[randPlayer]
+            ]
         )
 
         return IMAGES, SOUNDS, HITMASKS
@@ -159,14 +149,13 @@ class FlappyGame:
 
         newPipe1 = self._getRandomPipe()
         newPipe2 = self._getRandomPipe()
-        self.upperPipes = [
-            {"x": SCREENWIDTH + 200, "y": newPipe1[0]["y"]},
-            {"x": SCREENWIDTH + 200 + (SCREENWIDTH / 2), "y": newPipe2[0]["y"]},
-        ]
-        self.lowerPipes = [
-            {"x": SCREENWIDTH + 200, "y": newPipe1[1]["y"]},
-            {"x": SCREENWIDTH + 200 + (SCREENWIDTH / 2), "y": newPipe2[1]["y"]},
-        ]
+        self.pipes.clear()
+        self.pipes.append(SCREENWIDTH + 200, newPipe1[0]["y"], newPipe1[1]["y"])
+        self.pipes.append(
+            SCREENWIDTH + 200 + (SCREENWIDTH / 2), newPipe2[0]["y"], newPipe2[1]["y"]
+        )
+        self.nextPipe = 0  # first pipe the player has not cleared yet
+        self.scorePipe = 0  # first pipe whose midpoint the player has not passed yet
 
         self.pipeVelX = -4
         self.playerVelY = -9
@@ -179,30 +168,85 @@ class FlappyGame:
 
     def _get_state(self):
         """Gets the current state of the game for the AI."""
-        pipe_ind = 0
-        if (
-            len(self.upperPipes) > 1
-            and self.playerx
-            > self.upperPipes[0]["x"] + self.IMAGES["pipe"][0].get_width()
-        ):
-            pipe_ind = 1
+        pipeX, upperY, lowerY = self.pipes.pipe(self.nextPipe)
 
         state = {
             "player_y": self.playery,
             "player_vel": self.playerVelY,
-            "next_pipe_dist_to_player": self.lowerPipes[pipe_ind]["x"] - self.playerx,
-            "next_pipe_top_y": self.upperPipes[pipe_ind]["y"],
-            "next_pipe_bottom_y": self.lowerPipes[pipe_ind]["y"],
+            "next_pipe_dist_to_player": pipeX - self.playerx,
+            "next_pipe_top_y": upperY,
+            "next_pipe_bottom_y": lowerY,
         }
         return state
 
-    def frame_step(self, action, draw=True):
+    def observe(self, out):
+        """
+        Writes the state into a preallocated buffer instead of building a dict.
+        :param out: buffer of len(STATE_FEATURES) numbers (list, array or NumPy), filled in STATE_FEATURES order
+        :return: out
+        """
+        pipeX, upperY, lowerY = self.pipes.pipe(self.nextPipe)
+        out[0] = self.playery
+        out[1] = self.playerVelY
+        out[2] = pipeX - self.playerx
+        out[3] = upperY
+        out[4] = lowerY
+        return out
+
+    def frame_step(self, action, draw=True, out=None):
         """
         action: 0 for do nothing, 1 for flap
+        out: optional buffer the state is written to with observe, returned in place of the state dict
         Returns: (state, reward, done)
         """
 
-        pygame.event.pump()
+        if not self.headless:
+            pygame.event.pump()
+        reward, done = self._advance(action)
+
+        # --- Drawing ---
+        if draw and not self.headless:
+            self._draw_game_state()
+            pygame.display.update()
+            self.FPSCLOCK.tick(FPS)
+
+        state = self._get_state() if out is None else self.observe(out)
+        return state, reward, done
+
+    def frame_step_n(self, action, k, draw=True, out=None):
+        """
+        Apply an action then advance k frames, repeating frame_step without building a state every frame.
+        :param action: 0 for do nothing, 1 for flap, only applied on the first frame
+        :param k: number of frames to advance
+        :param draw: draw the last frame
+        :param out: optional buffer the state is written to with observe, returned in place of the state dict
+        :return: (state, reward, done) where reward is summed over the frames, stops early on a crash
+        """
+        if k < 1:
+            raise ValueError(f"frame_step_n advances at least 1 frame, got k={k}")
+        if not self.headless:
+            pygame.event.pump()
+        reward, done = self._advance(action)
+        for _ in range(k - 1):
+            if done:
+                break
+            frameReward, done = self._advance(0)
+            reward += frameReward
+
+        if draw and not self.headless:
+            self._draw_game_state()
+            pygame.display.update()
+            self.FPSCLOCK.tick(FPS)
+
+        state = self._get_state() if out is None else self.observe(out)
+        return state, reward, done
+
+    def _advance(self, action):
+        """
+        Advance the game by one frame, resetting it on a crash.
+        :param action: 0 for do nothing, 1 for flap
+        :return: (reward, done)
+        """
         reward = 0.1  # Reward for surviving
         done = False
 
@@ -210,16 +254,19 @@ class FlappyGame:
             if self.playery > -2 * self.IMAGES["player"][0].get_height():
                 self.playerVelY = self.playerFlapAcc
                 self.playerFlapped = True
-                self.SOUNDS["wing"].play()
+                self._playSound("wing")
 
-        # Check for score
+        # Check for score, only the first pipe not yet passed can cross the player's midpoint
         playerMidPos = self.playerx + self.IMAGES["player"][0].get_width() / 2
-        for pipe in self.upperPipes:
-            pipeMidPos = pipe["x"] + self.IMAGES["pipe"][0].get_width() / 2
-            if pipeMidPos <= playerMidPos < pipeMidPos + 4:
+        pipeMidPos = (
+            self.pipes.getX(self.scorePipe) + self.IMAGES["pipe"][0].get_width() / 2
+        )
+        if pipeMidPos <= playerMidPos:
+            self.scorePipe += 1
+            if playerMidPos < pipeMidPos + 4:
                 self.score += 1
                 reward = 1  # Reward for passing a pipe
-                self.SOUNDS["point"].play()
+                self._playSound("point")
 
         # Player's movement
         if self.playerVelY < self.playerMaxVelY and not self.playerFlapped:
@@ -230,38 +277,50 @@ class FlappyGame:
         self.playery += min(self.playerVelY, BASEY - self.playery - playerHeight)
 
         # Move pipes to left
-        for uPipe, lPipe in zip(self.upperPipes, self.lowerPipes):
-            uPipe["x"] += self.pipeVelX
-            lPipe["x"] += self.pipeVelX
+        pipes = self.pipes
+        pipes.scroll(self.pipeVelX)
 
-        # Add new pipe
-        if 0 < self.upperPipes[0]["x"] < 5:
+        # Add new pipe, spawning never moves the first pipe so its x is read once
+        firstX = pipes.getX(0)
+        if 0 < firstX < 5:
             newPipe = self._getRandomPipe()
-            self.upperPipes.append(newPipe[0])
-            self.lowerPipes.append(newPipe[1])
+            pipes.append(newPipe[0]["x"], newPipe[0]["y"], newPipe[1]["y"])
 
         # Remove old pipe
-        if self.upperPipes[0]["x"] < -self.IMAGES["pipe"][0].get_width():
-            self.upperPipes.pop(0)
-            self.lowerPipes.pop(0)
+        if firstX < -self.IMAGES["pipe"][0].get_width():
+            pipes.popleft()
+            self.nextPipe = max(self.nextPipe - 1, 0)
+            self.scorePipe = max(self.scorePipe - 1, 0)
+
+        # Advance past pipes the player has cleared, pipes only move left so this is O(1) per frame
+        while (
+            self.nextPipe < pipes.count - 1
+            and self.playerx
+            > pipes.getX(self.nextPipe) + self.IMAGES["pipe"][0].get_width()
+        ):
+            self.nextPipe += 1
 
         # Check for crash
         crashTest = self._checkCrash()
         if crashTest[0]:
             done = True
-            self.SOUNDS["hit"].play()
+            self._playSound("hit")
             if not crashTest[1]:
-                self.SOUNDS["die"].play()
+                self._playSound("die")
             reward = -1  # Penalty for crashing
             self.reset()
 
-        # --- Drawing ---
-        if draw:
-            self._draw_game_state()
-            pygame.display.update()
-            self.FPSCLOCK.tick(FPS)
+        return reward, done
 
-        return self._get_state(), reward, done
+    @property
+    def upperPipes(self):
+        """Upper pipes as a read only list of {"x", "y"} dicts."""
+        return self.pipes.upper
+
+    @property
+    def lowerPipes(self):
+        """Lower pipes as a read only list of {"x", "y"} dicts."""
+        return self.pipes.lower
 
     def _getRandomPipe(self):
         gapY = random.randrange(0, int(BASEY * 0.6 - PIPEGAPSIZE))
@@ -273,6 +332,11 @@ class FlappyGame:
             {"x": pipeX, "y": gapY + PIPEGAPSIZE},
         ]
 
+    def _playSound(self, name):
+        """Plays a sound, headless games have no mixer so this is a no-op."""
+        if not self.headless:
+            self.SOUNDS[name].play()
+
     def _showScore(self):
         scoreDigits = [int(x) for x in list(str(self.score))]
         totalWidth = 0
@@ -293,49 +357,34 @@ class FlappyGame:
         if player["y"] + player["h"] >= BASEY - 1:
             return [True, True]
         else:
-            playerRect = pygame.Rect(player["x"], player["y"], player["w"], player["h"])
-            pipeW = self.IMAGES["pipe"][0].get_width()
-            pipeH = self.IMAGES["pipe"][0].get_height()
-
-            for uPipe, lPipe in zip(self.upperPipes, self.lowerPipes):
-                uPipeRect = pygame.Rect(uPipe["x"], uPipe["y"], pipeW, pipeH)
-                lPipeRect = pygame.Rect(lPipe["x"], lPipe["y"], pipeW, pipeH)
-                pHitMask = self.HITMASKS["player"][0]
-                uHitmask = self.HITMASKS["pipe"][0]
-                lHitmask = self.HITMASKS["pipe"][1]
-
-                uCollide = self._pixelCollision(
-                    playerRect, uPipeRect, pHitMask, uHitmask
-                )
-                lCollide = self._pixelCollision(
-                    playerRect, lPipeRect, pHitMask, lHitmask
-                )
+            # Collision only depends on the pipe offset from the player, truncated like pygame.Rect
+            playerx, playery = int(player["x"]), int(player["y"])
+            uTable, lTable = self.COLLISIONS[0]
+
+            # Only pipes from the next uncleared one up to the player's right edge can overlap
+            pipes = self.pipes
+            for i in range(self.nextPipe, pipes.count):
+                pipeX, upperY, lowerY = pipes.pipe(i)
+                dx = int(pipeX) - playerx
+                if dx >= player["w"]:
+                    break
+                uCollide = uTable.collides(dx, upperY - playery)
+                lCollide = lTable.collides(dx, lowerY - playery)
 
                 if uCollide or lCollide:
                     return [True, False]
         return [False, False]
 
-    def _pixelCollision(self, rect1, rect2, hitmask1, hitmask2):
-        rect = rect1.clip(rect2)
-        if rect.width == 0 or rect.height == 0:
-            return False
-        x1, y1 = rect.x - rect1.x, rect.y - rect1.y
-        x2, y2 = rect.x - rect2.x, rect.y - rect2.y
-        for x in xrange(rect.width):
-            for y in xrange(rect.height):
-                if hitmask1[x1 + x][y1 + y] and hitmask2[x2 + x][y2 + y]:
-                    return True
-        return False
-
     def _draw_game_state(self):
         """Draws all the game elements to the screen."""
         # Draw background
         self.SCREEN.blit(self.IMAGES["background"], (0, 0))
 
         # Draw pipes
-        for uPipe, lPipe in zip(self.upperPipes, self.lowerPipes):
-            self.SCREEN.blit(self.IMAGES["pipe"][0], (uPipe["x"], uPipe["y"]))
-            self.SCREEN.blit(self.IMAGES["pipe"][1], (lPipe["x"], lPipe["y"]))
+        for i in range(self.pipes.count):
+            pipeX, upperY, lowerY = self.pipes.pipe(i)
+            self.SCREEN.blit(self.IMAGES["pipe"][0], (pipeX, upperY))
+            self.SCREEN.blit(self.IMAGES["pipe"][1], (pipeX, lowerY))
 
         # Draw base
         self.basex = -((-self.basex + 100) % self.baseShift)
@@ -482,7 +531,7 @@ def run_q_learning():
 
             # Q-learning agent decides action based on state
             action = QLearningAgent.act(
-                game.playerx, game.playery, game.playerVelY, game.lowerPipes
+                game.playerx, game.playery, game.playerVelY, game.pipes
             )
 
             # Game takes a step
@@ -5,6 +5,8 @@ import pygame
 import os
 from pygame.locals import *
 
+from collision import flipHitmask, loadHitmask, pixelCollision
+
 FPS = 30
 SCREENWIDTH = 288
 SCREENHEIGHT = 512
@@ -148,17 +150,19 @@ def main():
             ).convert_alpha(),
         )
 
-        # hismask for pipes
+        # hismask for pipes, cached per sprite file and flipped like the upper pipe image
+        pipeHitmask = loadHitmask(
+            os.path.join(ASSETS_PATH, PIPES_LIST[pipeindex][len("assets/") :])
+        )
         HITMASKS["pipe"] = (
-            getHitmask(IMAGES["pipe"][0]),
-            getHitmask(IMAGES["pipe"][1]),
+            flipHitmask(pipeHitmask, IMAGES["pipe"][1].get_width(), False, True),
+            pipeHitmask,
         )
 
         # hitmask for player
-        HITMASKS["player"] = (
-            getHitmask(IMAGES["player"][0]),
-            getHitmask(IMAGES["player"][1]),
-            getHitmask(IMAGES["player"][2]),
+        HITMASKS["player"] = tuple(
+            loadHitmask(os.path.join(ASSETS_PATH, p[len("assets/") :]))
+            for p in PLAYERS_LIST[randPlayer]
         )
 
         movementInfo = showWelcomeAnimation()
@@ -490,32 +494,5 @@ def checkCrash(player, upperPipes, lowerPipes):
     return [False, False]
 
 
-def pixelCollision(rect1, rect2, hitmask1, hitmask2):
-    """Checks if two objects collide and not just their rects"""
-    rect = rect1.clip(rect2)
-
-    if rect.width == 0 or rect.height == 0:
-        return False
-
-    x1, y1 = rect.x - rect1.x, rect.y - rect1.y
-    x2, y2 = rect.x - rect2.x, rect.y - rect2.y
-
-    for x in xrange(rect.width):
-        for y in xrange(rect.height):
-            if hitmask1[x1 + x][y1 + y] and hitmask2[x2 + x][y2 + y]:
-                return True
-    return False
-
-
-def getHitmask(image):
-    """returns a hitmask using an image's alpha."""
-    mask = []
-    for x in xrange(image.get_width()):
-        mask.append([])
-        for y in xrange(image.get_height()):
-            mask[x].append(bool(image.get_at((x, y))[3]))
-    return mask
-
-
 if __name__ == "__main__":
     main()
@@ -1,17 +1,27 @@
 from itertools import cycle
 from collections import deque
-import copy
+import argparse
 import random
+import signal
 import sys
 import pygame
 from pygame.locals import *
 
 # Initialize Q-learning agent
 
+from collision import flipHitmask, getCollisionTables, loadHitmask, loadSprite
 from config import config
-from q_learning import QLearning
-
-Agent = QLearning(config['train'])
+from pipes import PipeRing
+from q_learning import QLambda, QLearning
+from replay import AttemptStore
+from scenario_bank import ScenarioBank
+from snapshots import SnapshotRing
+
+if config['q_lambda']:
+    Agent = QLambda(config['train'], config['q_lambda'], online=config['online'],
+                    replay_capacity=config['prioritized_replay'])
+else:
+    Agent = QLearning(config['train'], config['online'], config['prioritized_replay'])
 
 if Agent.train:
     print("Training agent...")
@@ -29,8 +39,13 @@ PIPEGAPSIZE = 100  # gap between upper and lower part of pipe
 BASEY = SCREENHEIGHT * 0.79
 # image, sound and hitmask  dicts
 IMAGES, SOUNDS, HITMASKS = {}, {}, {}
-STATE_HISTORY = deque(maxlen=70)  # 70 is distance between pipes
-REPLAY_BUFFER = []
+COLLISIONS = ()  # (upper, lower) pipe collision tables per player frame
+ASSETS = {}  # every sprite variant, loaded once per process by loadAssets
+STATE_HISTORY = SnapshotRing(70)  # 70 is distance between pipes
+REPLAY_BUFFER = AttemptStore()  # moves of failed resume attempts
+SCENARIOS = ScenarioBank(config['scenario_bank']) if config['scenario_bank'] else None
+HEADLESS = False  # no window, event polling or frame clock, set by main
+STOP_REQUESTED = False  # set by SIGINT/SIGTERM when headless, the game checkpoints and exits at the end of the frame
 
 # list of all possible players (tuple of 3 positions of flap)
 PLAYERS_LIST = (
@@ -72,33 +87,32 @@ except NameError:
     xrange = range
 
 
-def main():
-    global SCREEN, FPSCLOCK
-    pygame.init()
-    FPSCLOCK = pygame.time.Clock()
-    SCREEN = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
-    pygame.display.set_caption('Flappy Bird')
+def main(headless=False):
+    """
+    Run episodes until quit.
+    :param headless: train without a display, event polling or frame clock, at raw simulation speed. SIGINT and
+        SIGTERM then save the Q-table and training states before exiting.
+    """
+    global SCREEN, FPSCLOCK, COLLISIONS, HEADLESS
+    HEADLESS = headless
+    if headless:
+        signal.signal(signal.SIGINT, requestStop)
+        signal.signal(signal.SIGTERM, requestStop)
+    else:
+        pygame.init()
+        FPSCLOCK = pygame.time.Clock()
+        SCREEN = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
+        pygame.display.set_caption('Flappy Bird')
 
     # numbers sprites for score display
-    IMAGES['numbers'] = (
-        pygame.image.load('assets/sprites/0.png').convert_alpha(),
-        pygame.image.load('assets/sprites/1.png').convert_alpha(),
-        pygame.image.load('assets/sprites/2.png').convert_alpha(),
-        pygame.image.load('assets/sprites/3.png').convert_alpha(),
-        pygame.image.load('assets/sprites/4.png').convert_alpha(),
-        pygame.image.load('assets/sprites/5.png').convert_alpha(),
-        pygame.image.load('assets/sprites/6.png').convert_alpha(),
-        pygame.image.load('assets/sprites/7.png').convert_alpha(),
-        pygame.image.load('assets/sprites/8.png').convert_alpha(),
-        pygame.image.load('assets/sprites/9.png').convert_alpha()
-    )
+    IMAGES['numbers'] = tuple(loadImage(f'assets/sprites/{i}.png') for i in range(10))
 
     # game over sprite
-    IMAGES['gameover'] = pygame.image.load('assets/sprites/gameover.png').convert_alpha()
+    IMAGES['gameover'] = loadImage('assets/sprites/gameover.png')
     # message sprite for welcome screen
-    IMAGES['message'] = pygame.image.load('assets/sprites/message.png').convert_alpha()
+    IMAGES['message'] = loadImage('assets/sprites/message.png')
     # base (ground) sprite
-    IMAGES['base'] = pygame.image.load('assets/sprites/base.png').convert_alpha()
+    IMAGES['base'] = loadImage('assets/sprites/base.png')
 
     # --- TURN OFF SOUNDS ---
 
@@ -114,42 +128,78 @@ def main():
     # SOUNDS['swoosh'] = pygame.mixer.Sound('assets/audio/swoosh' + soundExt)
     # SOUNDS['wing']   = pygame.mixer.Sound('assets/audio/wing' + soundExt)
 
+    loadAssets()
+
     while True:
         # select random background sprites
         randBg = random.randint(0, len(BACKGROUNDS_LIST) - 1)
-        IMAGES['background'] = pygame.image.load(BACKGROUNDS_LIST[randBg]).convert()
+        IMAGES['background'] = ASSETS['background'][randBg]
 
         # select random player sprites
         randPlayer = random.randint(0, len(PLAYERS_LIST) - 1)
-        IMAGES['player'] = (
-            pygame.image.load(PLAYERS_LIST[randPlayer][0]).convert_alpha(),
-            pygame.image.load(PLAYERS_LIST[randPlayer][1]).convert_alpha(),
-            pygame.image.load(PLAYERS_LIST[randPlayer][2]).convert_alpha(),
-        )
+        IMAGES['player'] = ASSETS['player'][randPlayer]
+        HITMASKS['player'] = ASSETS['playerHitmask'][randPlayer]
 
         # select random pipe sprites
         pipeindex = random.randint(0, len(PIPES_LIST) - 1)
-        IMAGES['pipe'] = (
-            pygame.transform.rotate(pygame.image.load(PIPES_LIST[pipeindex]).convert_alpha(), 180),
-            pygame.image.load(PIPES_LIST[pipeindex]).convert_alpha(),
-        )
+        IMAGES['pipe'] = ASSETS['pipe'][pipeindex]
+        HITMASKS['pipe'] = ASSETS['pipeHitmask'][pipeindex]
 
-        # hismask for pipes
-        HITMASKS['pipe'] = (
-            getHitmask(IMAGES['pipe'][0]),
-            getHitmask(IMAGES['pipe'][1]),
-        )
-
-        # hitmask for player
-        HITMASKS['player'] = (
-            getHitmask(IMAGES['player'][0]),
-            getHitmask(IMAGES['player'][1]),
-            getHitmask(IMAGES['player'][2]),
-        )
+        # pixel collisions for every pipe offset, per player frame
+        COLLISIONS = ASSETS['collision'][randPlayer][pipeindex]
 
         movementInfo = showWelcomeAnimation()
         crashInfo = mainGame(movementInfo)
-        showGameOverScreen(crashInfo)
+        if not HEADLESS:
+            showGameOverScreen(crashInfo)
+
+
+def loadImage(path, alpha=True):
+    """Returns a sprite converted for fast blitting, or on a per-pixel alpha surface when there is no display."""
+    return loadSprite(path, HEADLESS, alpha)
+
+
+def requestStop(signum, frame):
+    """Signal handler of the headless runner, the game checkpoints and exits at the end of the current frame."""
+    global STOP_REQUESTED
+    STOP_REQUESTED = True
+
+
+def quitGame(print_score=False):
+    """Save the Q-table and training states and exit."""
+    if print_score:
+        print('')
+    Agent.save_qvalues()
+    Agent.save_training_states()
+    pygame.quit()
+    sys.exit()
+
+
+def loadAssets():
+    """Load, convert and compute hitmasks of every sprite variant once, episodes only pick from these."""
+    ASSETS['background'] = tuple(loadImage(bg, alpha=False) for bg in BACKGROUNDS_LIST)
+    ASSETS['player'] = tuple(tuple(loadImage(frame) for frame in player) for player in PLAYERS_LIST)
+    # upper pipe is the rotated lower pipe
+    ASSETS['pipe'] = tuple(
+        (pygame.transform.rotate(pipe, 180), pipe) for pipe in (loadImage(p) for p in PIPES_LIST)
+    )
+
+    # hitmasks are cached per sprite file, the upper pipe mask is rotated like its image
+    ASSETS['playerHitmask'] = tuple(tuple(loadHitmask(frame) for frame in player) for player in PLAYERS_LIST)
+    ASSETS['pipeHitmask'] = tuple(
+        (flipHitmask(mask, pipe[1].get_width(), True, True), mask)
+        for pipe, mask in zip(ASSETS['pipe'], (loadHitmask(p) for p in PIPES_LIST))
+    )
+
+    # collision tables for every player and pipe combination
+    ASSETS['collision'] = tuple(
+        tuple(
+            getCollisionTables({'player': player, 'pipe': pipe},
+                               {'player': playerHitmask, 'pipe': pipeHitmask})
+            for pipe, pipeHitmask in zip(ASSETS['pipe'], ASSETS['pipeHitmask'])
+        )
+        for player, playerHitmask in zip(ASSETS['player'], ASSETS['playerHitmask'])
+    )
 
 
 def showWelcomeAnimation():
@@ -227,21 +277,14 @@ def mainGame(movementInfo):
     basex = movementInfo['basex']
     baseShift = IMAGES['base'].get_width() - IMAGES['background'].get_width()
 
-    # get 2 new pipes to add to upperPipes lowerPipes list
+    # get 2 new pipes to add to the ring of upper and lower pipes
     newPipe1 = getRandomPipe()
     newPipe2 = getRandomPipe()
 
-    # list of upper pipes
-    upperPipes = [
-        {'x': SCREENWIDTH + 200, 'y': newPipe1[0]['y']},
-        {'x': SCREENWIDTH + 200 + (SCREENWIDTH / 2), 'y': newPipe2[0]['y']},
-    ]
-
-    # list of lowerpipe
-    lowerPipes = [
-        {'x': SCREENWIDTH + 200, 'y': newPipe1[1]['y']},
-        {'x': SCREENWIDTH + 200 + (SCREENWIDTH / 2), 'y': newPipe2[1]['y']},
-    ]
+    pipes = PipeRing()
+    pipes.append(SCREENWIDTH + 200, newPipe1[0]['y'], newPipe1[1]['y'])
+    pipes.append(SCREENWIDTH + 200 + (SCREENWIDTH / 2), newPipe2[0]['y'], newPipe2[1]['y'])
+    pipeW = IMAGES['pipe'][0].get_width()
 
     pipeVelX = -4
 
@@ -261,50 +304,56 @@ def mainGame(movementInfo):
     if len(STATE_HISTORY) < 20:
         STATE_HISTORY.clear()
     resume_from_history = len(STATE_HISTORY) > 0 if Agent.train else None  # only resume if training
-    initial_len_history = len(STATE_HISTORY)
-    resume_from = 0
-    current_score = STATE_HISTORY[-1][5] if resume_from_history else None  # reset if beats the latest score in history
+    current_score = STATE_HISTORY.score(-1) if resume_from_history else None  # reset if beats the latest score in history
     print_score = False  # has the current score been printed?
+    nextPipe = 0  # first pipe the player has not cleared yet
+    scorePipe = 0  # first pipe whose midpoint the player has not passed yet
+    spawnQueue = deque()  # (upper y, lower y) of the next pipes to spawn instead of random pipes
+    scenario = None  # index of the bank scenario this game starts from
+
+    if resume_from_history:
+        # Load from saved game history, then spawn the pipes the history saw so the difficult segment is the same
+        playerx, playery, playerVelY, score, playerIndex = STATE_HISTORY.restore(0, pipes)
+        spawnQueue.extend(STATE_HISTORY.spawns(0))
+    elif SCENARIOS is not None and Agent.train and random.random() < config['scenario_chance']:
+        # Practise a difficult scenario from the bank, passing it means beating its score
+        scenario = SCENARIOS.sample()
+        if scenario is not None:
+            player, scenarioScore, spawns = SCENARIOS.restore(scenario, pipes)
+            playerx, playery, playerVelY, score, playerIndex = player
+            spawnQueue.extend(spawns)
 
     while True:
-        if resume_from_history:
-            # Load from saved game history
-            if resume_from < initial_len_history:
-                if resume_from == 0:
-                    playerx, playery, playerVelY, lowerPipes, upperPipes, score, playerIndex = \
-                        STATE_HISTORY[resume_from]
-                else:
-                    lowerPipes, upperPipes = STATE_HISTORY[resume_from][3], STATE_HISTORY[resume_from][4]
-                resume_from += 1
-        else:
+        if not resume_from_history:
             # Save game history for resuming
             if Agent.train and config['resume_score'] and score >= config['resume_score']:  # only save if training
-                    STATE_HISTORY.append([playerx, playery, playerVelY, copy.deepcopy(lowerPipes),
-                                          copy.deepcopy(upperPipes), score, playerIndex])
+                    STATE_HISTORY.append(playerx, playery, playerVelY, pipes, score, playerIndex)
 
-        for event in pygame.event.get():
-            if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
-                if print_score:
-                    print('')
-                Agent.save_qvalues()
-                Agent.save_training_states()
-                pygame.quit()
-                sys.exit()
-            if event.type == KEYDOWN and (event.key == K_SPACE or event.key == K_UP):
-                if playery > -2 * IMAGES['player'][0].get_height():
-                    playerVelY = playerFlapAcc
-                    playerFlapped = True
-                    # SOUNDS['wing'].play()
+        if HEADLESS:
+            if STOP_REQUESTED:
+                quitGame(print_score)
+        else:
+            for event in pygame.event.get():
+                if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+                    quitGame(print_score)
+                if event.type == KEYDOWN and (event.key == K_SPACE or event.key == K_UP):
+                    if playery > -2 * IMAGES['player'][0].get_height():
+                        playerVelY = playerFlapAcc
+                        playerFlapped = True
+                        # SOUNDS['wing'].play()
 
         # Agent to perform an action (0 is do nothing, 1 is flap)
-        if Agent.act(playerx, playery, playerVelY, lowerPipes):
+        if Agent.act(playerx, playery, playerVelY, pipes):
             if playery > -2 * IMAGES['player'][0].get_height():
                 playerVelY = playerFlapAcc
                 playerFlapped = True
 
+        # advance past pipes the player has cleared, pipes only move left so this is O(1) per frame
+        while nextPipe < pipes.count - 1 and playerx > pipes.getX(nextPipe) + pipeW:
+            nextPipe += 1
+
         # check for crash here
-        crashTest = checkCrash({'x': playerx, 'y': playery, 'index': playerIndex},
-                               upperPipes, lowerPipes)
+        crashTest = checkCrash({'x': playerx, 'y': playery, 'index': playerIndex}, pipes, nextPipe)
         if crashTest[0]:
             if print_score:
                 print('')
@@ -312,20 +361,32 @@ def mainGame(movementInfo):
                 # Managed to pass the difficult pipe
                 if score > current_score:
                     Agent.update_qvalues(score)
+                elif Agent.replay is not None:
+                    Agent.store_attempt()  # transitions go to the prioritized replay
                 else:
-                    REPLAY_BUFFER.append(copy.deepcopy(Agent.moves))
+                    REPLAY_BUFFER.append(*Agent.move_arrays(len(Agent.moves)))
+                    Agent.clear_moves()  # the next attempt starts from the same frame, keep only its own moves
                 # Or stuck in resume loop
-                if score > current_score or len(REPLAY_BUFFER) >= 50:
-                    # Update with a sample of the REPLAY_BUFFER (sample to avoid overfitting)
-                    random.shuffle(REPLAY_BUFFER)
-                    for _ in range(5):
-                        if REPLAY_BUFFER:  # don't pop if list is empty
-                            Agent.moves = REPLAY_BUFFER.pop()
-                            Agent.update_qvalues(current_score)
+                attempts = Agent.replay_attempts if Agent.replay is not None else len(REPLAY_BUFFER)
+                if score > current_score or attempts >= 50:
+                    if Agent.replay is not None:
+                        # Mini-batches of the transitions with the largest TD errors, across every scenario kept
+                        Agent.replay_updates(current_score)
+                    else:
+                        # Update with a sample of the REPLAY_BUFFER (sample to avoid overfitting)
+                        for moves in REPLAY_BUFFER.sample(5):
+                            Agent.update_qvalues(current_score, moves)
                     STATE_HISTORY.clear()
                     REPLAY_BUFFER.clear()
             else:
                 Agent.update_qvalues(score)  # only updates if training by default
+                if scenario is not None:
+                    if score > scenarioScore:
+                        SCENARIOS.record_pass(scenario)
+                    else:
+                        SCENARIOS.record_death(scenario)
+                elif SCENARIOS is not None and len(STATE_HISTORY) >= 20:
+                    SCENARIOS.add(STATE_HISTORY)  # keep the segment the bird died in to practise it again
             if Agent.train:
                 print(f"Episode: {Agent.episode}, alpha: {Agent.alpha}, score: {score}, max_score: {Agent.max_score}")
             else:
@@ -334,18 +395,21 @@ def mainGame(movementInfo):
                 'y': playery,
                 'groundCrash': crashTest[1],
                 'basex': basex,
-                'upperPipes': upperPipes,
-                'lowerPipes': lowerPipes,
+                'upperPipes': pipes.upper,
+                'lowerPipes': pipes.lower,
                 'score': score,
                 'playerVelY': playerVelY,
                 # 'playerRot': playerRot
             }
 
-        # check for score
+        # check for score, only pipes not yet passed can cross the player's midpoint
         playerMidPos = playerx + IMAGES['player'][0].get_width() / 2
-        for pipe in upperPipes:
-            pipeMidPos = pipe['x'] + IMAGES['pipe'][0].get_width() / 2
-            if pipeMidPos <= playerMidPos < pipeMidPos + 4:
+        while scorePipe < pipes.count:
+            pipeMidPos = pipes.getX(scorePipe) + pipeW / 2
+            if pipeMidPos > playerMidPos:
+                break
+            scorePipe += 1
+            if playerMidPos < pipeMidPos + 4:
                 score += 1
                 # Print every 10k scores
                 if score % config['print_score'] == 0:
@@ -367,8 +431,8 @@ def mainGame(movementInfo):
                         'y': playery,
                         'groundCrash': crashTest[1],
                         'basex': basex,
-                        'upperPipes': upperPipes,
-                        'lowerPipes': lowerPipes,
+                        'upperPipes': pipes.upper,
+                        'lowerPipes': pipes.lower,
                         'score': score,
                         'playerVelY': playerVelY,
                         # 'playerRot': playerRot
@@ -395,30 +459,32 @@ def mainGame(movementInfo):
         playerHeight = IMAGES['player'][playerIndex].get_height()
         playery += min(playerVelY, BASEY - playery - playerHeight)
 
-        # move pipes to left if done loading
-        if resume_from >= initial_len_history:
-            for uPipe, lPipe in zip(upperPipes, lowerPipes):
-                uPipe['x'] += pipeVelX
-                lPipe['x'] += pipeVelX
+        # move pipes to left
+        pipes.scroll(pipeVelX)
 
         # add new pipe when first pipe is about to touch left of screen
-        if 0 < upperPipes[0]['x'] < 5:
+        firstX = pipes.getX(0)
+        if 0 < firstX < 5:
             newPipe = getRandomPipe()
-            upperPipes.append(newPipe[0])
-            lowerPipes.append(newPipe[1])
+            if spawnQueue:
+                pipes.append(newPipe[0]['x'], *spawnQueue.popleft())
+            else:
+                pipes.append(newPipe[0]['x'], newPipe[0]['y'], newPipe[1]['y'])
 
         # remove first pipe if its out of the screen
-        if upperPipes[0]['x'] < -IMAGES['pipe'][0].get_width():
-            upperPipes.pop(0)
-            lowerPipes.pop(0)
+        if firstX < -pipeW:
+            pipes.popleft()
+            nextPipe = max(nextPipe - 1, 0)
+            scorePipe = max(scorePipe - 1, 0)
 
-        if config['show_game']:
+        if config['show_game'] and not HEADLESS:
             # draw sprites
             SCREEN.blit(IMAGES['background'], (0, 0))
 
-            for uPipe, lPipe in zip(upperPipes, lowerPipes):
-                SCREEN.blit(IMAGES['pipe'][0], (uPipe['x'], uPipe['y']))
-                SCREEN.blit(IMAGES['pipe'][1], (lPipe['x'], lPipe['y']))
+            for i in range(pipes.count):
+                pipeX, upperY, lowerY = pipes.pipe(i)
+                SCREEN.blit(IMAGES['pipe'][0], (pipeX, upperY))
+                SCREEN.blit(IMAGES['pipe'][1], (pipeX, lowerY))
 
             SCREEN.blit(IMAGES['base'], (basex, BASEY))
             # print score so player overlaps the score
@@ -460,10 +526,7 @@ def showGameOverScreen(crashInfo):
     while True:
         for event in pygame.event.get():
             if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
-                Agent.save_qvalues()
-                Agent.save_training_states()
-                pygame.quit()
-                sys.exit()
+                quitGame()
             if event.type == KEYDOWN and (event.key == K_SPACE or event.key == K_UP):
                 if playery + playerHeight >= BASEY - 1:
                     return
@@ -542,8 +605,8 @@ def showScore(score):
         Xoffset += IMAGES['numbers'][digit].get_width()
 
 
-def checkCrash(player, upperPipes, lowerPipes):
-    """Returns True if player collders with base or pipes."""
+def checkCrash(player, pipes, start=0):
+    """Returns True if player collders with base or pipes in the PipeRing, pipes before start are already cleared."""
     pi = player['index']
     player['w'] = IMAGES['player'][0].get_width()
     player['h'] = IMAGES['player'][0].get_height()
@@ -552,25 +615,20 @@ def checkCrash(player, upperPipes, lowerPipes):
     if player['y'] + player['h'] >= BASEY - 1:
         return [True, True]
     else:
+        # collision only depends on the pipe offset from the player, truncated like pygame.Rect
+        playerx, playery = int(player['x']), int(player['y'])
+        uTable, lTable = COLLISIONS[pi]
 
-        playerRect = pygame.Rect(player['x'], player['y'],
-                                 player['w'], player['h'])
-        pipeW = IMAGES['pipe'][0].get_width()
-        pipeH = IMAGES['pipe'][0].get_height()
-
-        for uPipe, lPipe in zip(upperPipes, lowerPipes):
-            # upper and lower pipe rects
-            uPipeRect = pygame.Rect(uPipe['x'], uPipe['y'], pipeW, pipeH)
-            lPipeRect = pygame.Rect(lPipe['x'], lPipe['y'], pipeW, pipeH)
-
-            # player and upper/lower pipe hitmasks
-            pHitMask = HITMASKS['player'][pi]
-            uHitmask = HITMASKS['pipe'][0]
-            lHitmask = HITMASKS['pipe'][1]
+        # only pipes from start up to the player's right edge can overlap
+        for i in range(start, pipes.count):
+            pipeX, upperY, lowerY = pipes.pipe(i)
+            dx = int(pipeX) - playerx
+            if dx >= player['w']:
+                break
 
             # if bird collided with upipe or lpipe
-            uCollide = pixelCollision(playerRect, uPipeRect, pHitMask, uHitmask)
-            lCollide = pixelCollision(playerRect, lPipeRect, pHitMask, lHitmask)
+            uCollide = uTable.collides(dx, upperY - playery)
+            lCollide = lTable.collides(dx, lowerY - playery)
 
             if uCollide or lCollide:
                 return [True, False]
@@ -578,32 +636,8 @@ def checkCrash(player, upperPipes, lowerPipes):
     return [False, False]
 
 
-def pixelCollision(rect1, rect2, hitmask1, hitmask2):
-    """Checks if two objects collide and not just their rects"""
-    rect = rect1.clip(rect2)
-
-    if rect.width == 0 or rect.height == 0:
-        return False
-
-    x1, y1 = rect.x - rect1.x, rect.y - rect1.y
-    x2, y2 = rect.x - rect2.x, rect.y - rect2.y
-
-    for x in xrange(rect.width):
-        for y in xrange(rect.height):
-            if hitmask1[x1 + x][y1 + y] and hitmask2[x2 + x][y2 + y]:
-                return True
-    return False
-
-
-def getHitmask(image):
-    """Returns a hitmask using an image's alpha."""
-    mask = []
-    for x in xrange(image.get_width()):
-        mask.append([])
-        for y in xrange(image.get_height()):
-            mask[x].append(bool(image.get_at((x, y))[3]))
-    return mask
-
-
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Train or run the Q-learning agent.')
+    parser.add_argument('--headless', action='store_true', default=config['headless'],
+                        help='no display, event polling or frame clock, SIGINT/SIGTERM save and exit')
+    main(parser.parse_args().headless)
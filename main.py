@@ -458,24 +458,15 @@ def checkCrash(player, upperPipes, lowerPipes):
     if player["y"] + player["h"] >= BASEY - 1:
         return [True, True]
     else:
-
-        playerRect = pygame.Rect(player["x"], player["y"], player["w"], player["h"])
-        pipeW = game_env.IMAGES["pipe"][0].get_width()
-        pipeH = game_env.IMAGES["pipe"][0].get_height()
+        # collision only depends on the pipe offset from the player, truncated like pygame.Rect
+        playerx, playery = int(player["x"]), int(player["y"])
+        uTable, lTable = game_env.COLLISIONS[pi]
 
         for uPipe, lPipe in zip(upperPipes, lowerPipes):
-            # upper and lower pipe rects
-            uPipeRect = pygame.Rect(uPipe["x"], uPipe["y"], pipeW, pipeH)
-            lPipeRect = pygame.Rect(lPipe["x"], lPipe["y"], pipeW, pipeH)
-
-            # player and upper/lower pipe hitmasks
-            pHitMask = game_env.HITMASKS["player"][pi]
-            uHitmask = game_env.HITMASKS["pipe"][0]
-            lHitmask = game_env.HITMASKS["pipe"][1]
-
             # if bird collided with upipe or lpipe
-            uCollide = pixelCollision(playerRect, uPipeRect, pHitMask, uHitmask)
-            lCollide = pixelCollision(playerRect, lPipeRect, pHitMask, lHitmask)
+            dx = int(uPipe["x"]) - playerx
+            uCollide = uTable.collides(dx, int(uPipe["y"]) - playery)
+            lCollide = lTable.collides(dx, int(lPipe["y"]) - playery)
 
             if uCollide or lCollide:
                 return [True, False]
@@ -483,33 +474,6 @@ def checkCrash(player, upperPipes, lowerPipes):
     return [False, False]
 
 
-def pixelCollision(rect1, rect2, hitmask1, hitmask2):
-    """Checks if two objects collide and not just their rects"""
-    rect = rect1.clip(rect2)
-
-    if rect.width == 0 or rect.height == 0:
-        return False
-
-    x1, y1 = rect.x - rect1.x, rect.y - rect1.y
-    x2, y2 = rect.x - rect2.x, rect.y - rect2.y
-
-    for x in xrange(rect.width):
-        for y in xrange(rect.height):
-            if hitmask1[x1 + x][y1 + y] and hitmask2[x2 + x][y2 + y]:
-                return True
-    return False
-
-
-def getHitmask(image):
-    """returns a hitmask using an image's alpha."""
-    mask = []
-    for x in xrange(image.get_width()):
-        mask.append([])
-        for y in xrange(image.get_height()):
-            mask[x].append(bool(image.get_at((x, y))[3]))
-    return mask
-
-
 def run_neat(config_file, game):
     """
     runs the NEAT algorithm to train a neural network to play flappy bird.
@@ -0,0 +1,95 @@
+"""
+Ring buffer of the agent's (state, action, new state) moves.
+
+Moves are held as int32 state indices and int8 actions in typed arrays, about 9 bytes per move instead of a
+tuple per move in a list. The arrays grow up to the capacity and are then reused as a ring, so removing the
+oldest moves only moves the head index and clearing keeps the memory for the next episode.
+"""
+from array import array
+
+
+class MoveBuffer:
+    """Moves in the order they were made, move i (0 is the oldest) is in slot (head + i) % capacity."""
+
+    def __init__(self, capacity):
+        """
+        Create an empty buffer.
+        :param capacity: maximum number of moves held at once
+        """
+        self.capacity = capacity
+        self.states = array("i")
+        self.actions = array("b")
+        self.new_states = array("i")
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, state, action, new_state):
+        """
+        Add the newest move.
+        :param state: state index the action was taken in
+        :param action: 0 for do nothing, 1 for flap
+        :param new_state: state index after the action
+        """
+        if self.count == self.capacity:
+            raise IndexError("append to a full move buffer")
+        slot = self.head + self.count
+        if slot >= self.capacity:
+            slot -= self.capacity
+        if slot == len(self.states):
+            self.states.append(state)
+            self.actions.append(action)
+            self.new_states.append(new_state)
+        else:
+            self.states[slot] = state
+            self.actions[slot] = action
+            self.new_states[slot] = new_state
+        self.count += 1
+
+    def first(self):
+        """Returns the oldest (state, action, new state) move."""
+        if not self.count:
+            raise IndexError("first of an empty move buffer")
+        return self.states[self.head], self.actions[self.head], self.new_states[self.head]
+
+    def last(self):
+        """Returns the newest (state, action, new state) move."""
+        if not self.count:
+            raise IndexError("last of an empty move buffer")
+        slot = (self.head + self.count - 1) % self.capacity
+        return self.states[slot], self.actions[slot], self.new_states[slot]
+
+    def popleft(self, n):
+        """Remove the n oldest moves."""
+        n = min(n, self.count)
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+
+    def clear(self):
+        """Remove every move, the arrays are kept for the next moves."""
+        self.head = 0
+        self.count = 0
+
+    def _column(self, column, start, stop):
+        """Returns moves [start, stop) of one column as an array, oldest first."""
+        start, stop = self.head + start, self.head + stop
+        if start >= self.capacity:
+            start, stop = start - self.capacity, stop - self.capacity
+        if stop <= self.capacity:
+            return column[start:stop]
+        return column[start:] + column[: stop - self.capacity]
+
+    def columns(self, start=0, stop=None):
+        """
+        Returns moves as (states, actions, new states) arrays, oldest first.
+        :param start: index of the oldest move to include
+        :param stop: index after the newest move to include, all moves by default
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        return (
+            self._column(self.states, start, stop),
+            self._column(self.actions, start, stop),
+            self._column(self.new_states, start, stop),
+        )
@@ -0,0 +1,352 @@
+"""
+Parallel Q-learning: K worker processes play headless games and a coordinator merges their Q-tables.
+
+Each worker trains its own QLearning agent against its own FlappyGame. Every sync_frames frames it pushes the rows
+of its Q-table that changed since its last sync, as deltas from the values the coordinator last sent it, with the
+visit counts it added and the records of the episodes it finished. The coordinator adds the deltas to the merged
+table and replies with every row that changed in the merged table since that worker's last sync, so the worker
+keeps playing from the merged values. Workers never wait for each other, only for the coordinator's reply to their
+own push, so episodes per hour scale with the number of cores.
+
+Rows updated by two workers between syncs get both deltas, like asynchronous SGD, syncing often keeps those
+overlaps small.
+
+The merged table, episode log and alpha are those of QLearning: data/q_values_resume.qtable and
+data/training_values_resume.jsonl. Resuming from difficult segments (config['resume_score']) and the scenario bank
+are not used here, run flappy_rl.py for those.
+
+SharedTrainer is the alternative with no merging: its workers are Hogwild actors that all act from and update one
+SharedQTable in shared memory, with no locks, so each update is seen by every actor as soon as it is written.
+
+Run this module to train, SIGINT or SIGTERM saves the merged table and the episode log before exiting. --benchmark
+compares the training frames per second of one process and of Hogwild actors.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import random
+import signal
+import time
+
+import numpy as np
+
+from config import config
+from environment import FlappyGame
+from q_learning import QLearning
+from q_table import N_STATES, SharedQTable
+
+
+class ParallelTrainer:
+    """Coordinator of the worker processes, holding the merged Q-table."""
+
+    def __init__(self, workers=None, sync_frames=20000, seed=None):
+        """
+        Load the agent to train, its Q-table is the merged table.
+        :param workers: number of worker processes, one per core by default
+        :param sync_frames: frames a worker plays between pushes to the coordinator
+        :param seed: seed of the workers' random pipes, worker i uses seed + i, random by default
+        """
+        self.workers = workers or os.cpu_count()
+        self.sync_frames = sync_frames
+        self.seed = seed
+        self.agent = QLearning(True)
+        self.version = 0  # number of merges
+        self.row_versions = None  # version of the last merge that changed each row, set by run
+        self.stop_requested = False
+
+    def request_stop(self, signum, frame):
+        """Signal handler, the workers are stopped at their next push and the merged table is saved."""
+        self.stop_requested = True
+
+    def merge(self, rows, q_deltas, visits):
+        """
+        Add a worker's deltas to the merged table.
+        :param rows: array of the state indices that changed
+        :param q_deltas: array of the change in the Q-values of each row
+        :param visits: array of the visits added to each row
+        """
+        table = self.agent.q_values
+        table.q[rows] += q_deltas
+        table.visits[rows] += visits
+        self.version += 1
+        self.row_versions[rows] = self.version
+
+    def log_episodes(self, worker, records):
+        """
+        Add the episodes a worker played to the agent and its log, numbered in the order they reach the coordinator.
+        :param worker: index of the worker
+        :param records: episode log records of the worker's agent
+        """
+        agent = self.agent
+        for record in records:
+            agent.episode += 1
+            agent.scores.append(record['score'])
+            agent.max_score = max(record['score'], agent.max_score)
+            record.update(episode=agent.episode, max_score=agent.max_score, worker=worker)
+            agent.log.append(record)
+
+    def run(self, episodes=None):
+        """
+        Train until the agent has played episodes more episodes, or until SIGINT or SIGTERM, then save.
+        :param episodes: number of episodes to play, None to train until stopped
+        """
+        agent = self.agent
+        target = None if episodes is None else agent.episode + episodes
+        start_episode, start_time = agent.episode, time.time()
+        self.version = 1  # rows seen before training are at version 1
+        self.row_versions = np.zeros(N_STATES, dtype=np.int64)
+        self.row_versions[agent.q_values.seen()] = 1
+        synced = [0] * self.workers  # merged table version each worker last received
+        pushes = mp.Queue()
+        replies = [mp.Queue() for _ in range(self.workers)]
+        processes = [
+            mp.Process(target=worker, args=(i, pushes, replies[i], agent.alpha, self.sync_frames,
+                                            None if self.seed is None else self.seed + i), daemon=True)
+            for i in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        handlers = [signal.signal(sig, self.request_stop) for sig in (signal.SIGINT, signal.SIGTERM)]
+        print(f"Training with {self.workers} workers...")
+
+        running = self.workers
+        while running:
+            try:
+                i, rows, q_deltas, visits, records = pushes.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break  # every worker was killed, save what was merged
+                continue
+            if len(rows):
+                self.merge(rows, q_deltas, visits)
+            self.log_episodes(i, records)
+            if self.stop_requested or (target is not None and agent.episode >= target):
+                replies[i].put(None)
+                running -= 1
+                continue
+            changed = np.flatnonzero(self.row_versions > synced[i])
+            synced[i] = self.version
+            replies[i].put((changed, agent.q_values.q[changed], agent.q_values.visits[changed]))
+            if records:
+                hours = (time.time() - start_time) / 3600
+                print(f"Episode: {agent.episode}, max_score: {agent.max_score}, "
+                      f"episodes/hour: {(agent.episode - start_episode) / hours:,.0f}")
+
+        for process in processes:
+            process.join()
+        for sig, handler in zip((signal.SIGINT, signal.SIGTERM), handlers):
+            signal.signal(sig, handler)
+        agent.save_qvalues()
+        agent.save_training_states()
+
+
+class SharedTrainer(ParallelTrainer):
+    """Hogwild training, the workers update the Q-table in shared memory themselves."""
+
+    def run(self, episodes=None):
+        """
+        Train until the agent has played episodes more episodes, or until SIGINT or SIGTERM, then save.
+        :param episodes: number of episodes to play, None to train until stopped
+        """
+        agent = self.agent
+        target = None if episodes is None else agent.episode + episodes
+        start_episode, start_time = agent.episode, time.time()
+        table = SharedQTable()
+        table.q[:] = agent.q_values.q
+        table.visits[:] = agent.q_values.visits
+        records = mp.Queue()
+        stop = mp.Event()
+        processes = [
+            mp.Process(target=actor, args=(i, table.name, records, stop, agent.alpha, self.sync_frames,
+                                           None if self.seed is None else self.seed + i), daemon=True)
+            for i in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        handlers = [signal.signal(sig, self.request_stop) for sig in (signal.SIGINT, signal.SIGTERM)]
+        print(f"Training with {self.workers} Hogwild workers...")
+
+        running = self.workers
+        while running:
+            try:
+                i, episode_records = records.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break  # every worker was killed, save the table as it is
+                episode_records = []
+            else:
+                if episode_records is None:  # the worker has stopped
+                    running -= 1
+                    continue
+                self.log_episodes(i, episode_records)
+            if self.stop_requested or (target is not None and agent.episode >= target):
+                stop.set()
+            elif episode_records:
+                hours = (time.time() - start_time) / 3600
+                print(f"Episode: {agent.episode}, max_score: {agent.max_score}, "
+                      f"episodes/hour: {(agent.episode - start_episode) / hours:,.0f}")
+
+        for process in processes:
+            process.join()
+        for sig, handler in zip((signal.SIGINT, signal.SIGTERM), handlers):
+            signal.signal(sig, handler)
+        agent.q_values = table.to_table()
+        table.close()
+        table.unlink()
+        agent.save_qvalues()
+        agent.save_training_states()
+
+
+def play(agent, game, frames):
+    """
+    Train an agent for a number of frames of a headless game, an episode ends when the bird crashes or reaches
+    config['max_score']. An episode still being played when the frames run out carries on at the next call.
+    :param agent: QLearning agent
+    :param game: headless FlappyGame
+    :param frames: number of frames to play
+    """
+    observation = [0] * 5
+    for _ in range(frames):
+        score = game.score
+        action = agent.act(game.playerx, game.playery, game.playerVelY, game.pipes)
+        _, _, done = game.frame_step(action, draw=False, out=observation)
+        if done:  # the game resets itself on a crash
+            agent.update_qvalues(score)
+        elif config['max_score'] and game.score >= config['max_score']:
+            agent.end_episode(game.score)
+            game.reset()
+
+
+def make_worker(seed, alpha=None, name=None):
+    """
+    Returns a training agent starting from an empty table, its episode records kept in memory, and a headless game.
+    :param seed: seed of the random pipes, None for a random seed
+    :param alpha: learning rate to start from, the agent's initial rate by default
+    :param name: name of a SharedQTable to act from and update instead of a table of its own
+    """
+    random.seed(seed)  # forked workers would otherwise all play the same pipes
+    agent = QLearning(True, load=False, log_path=None)
+    if alpha is not None:
+        agent.alpha = alpha
+    if name is not None:
+        agent.q_values = SharedQTable(name)
+    return agent, FlappyGame(headless=True)
+
+
+def worker(index, pushes, replies, alpha, sync_frames, seed):
+    """
+    Play episodes in a headless game and sync the Q-table with the coordinator, until it replies None.
+    :param index: index of the worker
+    :param pushes: queue of (index, rows, Q deltas, visits, episode records) to the coordinator
+    :param replies: queue of (rows, Q-values, visits) of the merged table from the coordinator
+    :param alpha: learning rate to start from
+    :param sync_frames: frames to play between pushes
+    :param seed: seed of the random pipes, None for a random seed
+    """
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_IGN)  # the coordinator stops the workers, even if the whole group is signalled
+    agent, game = make_worker(seed, alpha)
+    table = agent.q_values
+    base_q, base_visits = table.q.copy(), table.visits.copy()  # merged values last received
+
+    # The first push is empty and gets the whole merged table back
+    pushes.put((index, np.zeros(0, dtype=np.int64), np.zeros((0, 2), dtype=np.float32),
+                np.zeros(0, dtype=np.uint32), []))
+    while True:
+        reply = replies.get()
+        if reply is None:
+            return
+        rows, q, visits = reply
+        table.q[rows] = base_q[rows] = q
+        table.visits[rows] = base_visits[rows] = visits
+
+        # An episode still being played carries on after the sync, from the merged values
+        play(agent, game, sync_frames)
+
+        rows = np.flatnonzero((table.q != base_q).any(axis=1) | (table.visits != base_visits))
+        pushes.put((index, rows, table.q[rows] - base_q[rows], table.visits[rows] - base_visits[rows],
+                    agent.log.drain()))
+
+
+def actor(index, name, records, stop, alpha, sync_frames, seed):
+    """
+    Play episodes in a headless game, acting from and updating a shared Q-table, until stop is set.
+    :param index: index of the worker
+    :param name: name of the SharedQTable
+    :param records: queue of (index, episode records) to the trainer, (index, None) once stopped
+    :param stop: event set to stop the worker
+    :param alpha: learning rate to start from
+    :param sync_frames: frames to play between sending episode records and checking stop
+    :param seed: seed of the random pipes, None for a random seed
+    """
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_IGN)  # the trainer stops the workers, even if the whole group is signalled
+    agent, game = make_worker(seed, alpha, name)
+    while not stop.is_set():
+        play(agent, game, sync_frames)
+        records.put((index, agent.log.drain()))
+    agent.q_values.close()
+    records.put((index, None))
+
+
+def benchmark(workers=None, frames=200000, seed=None):
+    """
+    Print the training frames per second of one process and of Hogwild workers sharing a Q-table. Every agent
+    starts from an empty table and nothing is saved.
+    :param workers: number of Hogwild workers, one per core by default
+    :param frames: frames each process plays
+    :param seed: seed of the random pipes, worker i uses seed + i, random by default
+    """
+    workers = workers or os.cpu_count()
+    seeds = [None if seed is None else seed + i for i in range(workers)]
+
+    agent, game = make_worker(seeds[0])
+    start = time.perf_counter()
+    play(agent, game, frames)
+    single = frames / (time.perf_counter() - start)
+    print(f"1 process: {single:,.0f} frames/s")
+
+    table = SharedQTable()
+    ready = mp.Barrier(workers + 1)  # setup is not timed, every worker starts playing at once
+    done = mp.Queue()
+    processes = [mp.Process(target=benchmark_actor, args=(table.name, frames, seeds[i], ready, done))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    ready.wait()
+    start = time.perf_counter()
+    for _ in range(workers):
+        done.get()
+    shared = workers * frames / (time.perf_counter() - start)
+    for process in processes:
+        process.join()
+    table.close()
+    table.unlink()
+    print(f"{workers} Hogwild workers: {shared:,.0f} frames/s, {shared / single:.2f}x one process")
+
+
+def benchmark_actor(name, frames, seed, ready, done):
+    """Play frames updating a shared Q-table once every benchmark worker is ready, then put None on done."""
+    agent, game = make_worker(seed, name=name)
+    ready.wait()
+    play(agent, game, frames)
+    done.put(None)
+    agent.q_values.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the Q-learning agent in parallel worker processes.")
+    parser.add_argument("--workers", type=int, default=None, help="number of workers, one per core by default")
+    parser.add_argument("--episodes", type=int, default=None, help="episodes to play, until stopped by default")
+    parser.add_argument("--sync-frames", type=int, default=20000, help="frames a worker plays between syncs")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random pipes")
+    parser.add_argument("--shared", action="store_true", help="Hogwild workers sharing one table, no merging")
+    parser.add_argument("--benchmark", type=int, metavar="FRAMES", default=0,
+                        help="compare the frames per second of one process and of Hogwild workers, then exit")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.workers, args.benchmark, args.seed)
+    else:
+        trainer = SharedTrainer if args.shared else ParallelTrainer
+        trainer(args.workers, args.sync_frames, args.seed).run(args.episodes)
@@ -0,0 +1,113 @@
+"""
+Fixed capacity ring buffer of pipes.
+
+Pipe x and gap y values live in small typed arrays instead of a list of dicts per pipe. Every pipe scrolls at
+the same speed, so x is stored relative to a shared scroll offset and moving all pipes is a single add to
+that offset. Spawning writes the slot after the tail and removing the first pipe only moves the head index,
+so nothing is allocated while a game runs.
+"""
+from array import array
+
+# At most 3 pipes are on screen at once (pipes are 144px apart), keep a spare slot
+PIPE_CAPACITY = 4
+
+
+class PipeRing:
+    """Upper and lower pipes stored by slot, pipe i (0 is the leftmost) is in slot (head + i) % capacity."""
+
+    def __init__(self, capacity=PIPE_CAPACITY):
+        """
+        Create an empty ring.
+        :param capacity: maximum number of pipes held at once
+        """
+        self.capacity = capacity
+        self.xs = array("d", [0.0]) * capacity  # pipe x minus offset
+        self.upperYs = array("q", [0]) * capacity
+        self.lowerYs = array("q", [0]) * capacity
+        self.offset = 0  # total scroll since the ring was cleared
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def slot(self, i):
+        """Returns the buffer slot of the i-th pipe from the left."""
+        return (self.head + i) % self.capacity
+
+    def getX(self, i):
+        """Returns the x of the i-th pipe from the left."""
+        return self.xs[(self.head + i) % self.capacity] + self.offset
+
+    def pipe(self, i):
+        """Returns (x, upper y, lower y) of the i-th pipe from the left."""
+        slot = (self.head + i) % self.capacity
+        return self.xs[slot] + self.offset, self.upperYs[slot], self.lowerYs[slot]
+
+    def clear(self):
+        """Remove every pipe."""
+        self.offset = 0
+        self.head = 0
+        self.count = 0
+
+    def append(self, x, upperY, lowerY):
+        """
+        Add a pipe to the right of the others.
+        :param x: x of both pipe halves
+        :param upperY: y of the upper pipe
+        :param lowerY: y of the lower pipe
+        """
+        if self.count == self.capacity:
+            raise IndexError("append to a full pipe ring")
+        slot = (self.head + self.count) % self.capacity
+        self.xs[slot] = x - self.offset
+        self.upperYs[slot] = upperY
+        self.lowerYs[slot] = lowerY
+        self.count += 1
+
+    def popleft(self):
+        """Remove the leftmost pipe."""
+        if not self.count:
+            raise IndexError("pop from an empty pipe ring")
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+
+    def scroll(self, dx):
+        """Move every pipe by dx."""
+        self.offset += dx
+
+    @property
+    def upper(self):
+        """Read only list of {'x', 'y'} dicts view of the upper pipes."""
+        return PipeView(self, self.upperYs)
+
+    @property
+    def lower(self):
+        """Read only list of {'x', 'y'} dicts view of the lower pipes."""
+        return PipeView(self, self.lowerYs)
+
+
+class PipeView:
+    """
+    Sequence of {'x', 'y'} dicts over one half of a PipeRing, for code written against the old pipe lists
+    such as the crash info of mainGame and FlappyGame.upperPipes. Dicts are built on access so writing to them
+    does not move the pipes.
+    """
+
+    def __init__(self, ring, ys):
+        self.ring = ring
+        self.ys = ys
+
+    def __len__(self):
+        return self.ring.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.ring.count
+        if not 0 <= i < self.ring.count:
+            raise IndexError("pipe index out of range")
+        slot = self.ring.slot(i)
+        return {"x": self.ring.xs[slot] + self.ring.offset, "y": self.ys[slot]}
+
+    def __iter__(self):
+        return (self[i] for i in range(self.ring.count))
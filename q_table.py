@@ -0,0 +1,418 @@
+"""
+Dense Q-table for the QLearning agent.
+
+A state is the discretized (x0, y0, vel, y1) tuple built by QLearning.get_state. Every component only takes
+a fixed set of values, so each gets a bin index and the four bins pack into one integer state index. Q-values
+are a float32 (n_states, 2) array indexed by state and action, with a uint32 count of visits per state.
+Q-values that decay below the smallest float32 round to 0 (e.g. -2.1e-46 becomes -0.0), where the float64 values of
+the old dict stayed non zero, so ties between the two actions of a state break differently and training from the
+same seed does not take the same actions as a float64 table: from an empty table it diverges after about 126k frames.
+
+Tables are saved in a binary format holding only the seen states: a header, the sorted int32 state indices,
+then the float32 Q-values and uint32 visit counts as contiguous little endian columns. The file can be
+memory-mapped as is, see MappedQTable. Run this module to convert json tables to binary and back.
+
+SharedQTable holds the same arrays in shared memory, for several processes to train one table, see parallel.py.
+It needs Python 3.8, everything else in this module runs on 3.7.
+"""
+import argparse
+import json
+import os
+import struct
+from array import array
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # added in Python 3.8, only SharedQTable needs it
+    shared_memory = None
+
+# x0 is exact in [-49, -40), a multiple of 10 in [-40, 140) and a multiple of 70 from 140 up to 630
+X_BINS = 9 + 18 + 8
+# y0 and y1 are multiples of 60 in [-360, -180), of 10 in [-180, 180) and of 60 from 180 up to 600
+Y_BINS = 3 + 36 + 8
+# vel is the bird velocity, from the flap velocity up to the max falling velocity
+VEL_MIN, VEL_BINS = -9, 20
+N_STATES = X_BINS * Y_BINS * VEL_BINS * Y_BINS
+
+# Binary table header: magic, format version, the X/Y/vel bin counts the indices were packed with and the number
+# of states, padded to 32 bytes so every column is aligned
+QTABLE_HEADER = "<8sHHHHI12x"
+QTABLE_MAGIC = b"FLAPQTAB"
+QTABLE_VERSION = 1
+
+# Raw integer differences covered by the discretization lookup tables, beyond these every value is in an edge bin
+X_RAW_MIN, X_RAW_MAX = -100, 700
+Y_RAW_MIN, Y_RAW_MAX = -500, 700
+
+
+def discretize_x(x0):
+    """Bucket a raw x distance to the next pipe, x0 is exact below -40 and rounded down to 10 or 70 above."""
+    if x0 < -40:
+        return int(x0)
+    elif x0 < 140:
+        return int(x0) - (int(x0) % 10)
+    else:
+        return int(x0) - (int(x0) % 70)
+
+
+def discretize_y(y):
+    """Bucket a raw y distance to a lower pipe, rounded down to 10 within 180 of the pipe and to 60 beyond."""
+    if -180 < y < 180:
+        return int(y) - (int(y) % 10)
+    else:
+        return int(y) - (int(y) % 60)
+
+
+def x_index(x0):
+    """Bin of a discretized x0, values outside the bins use the nearest edge bin."""
+    if x0 < -40:
+        return max(x0 + 49, 0)
+    if x0 < 140:
+        return 9 + (x0 + 40) // 10
+    return min(27 + (x0 - 140) // 70, X_BINS - 1)
+
+
+def x_value(i):
+    """Discretized x0 of a bin."""
+    if i < 9:
+        return i - 49
+    if i < 27:
+        return (i - 9) * 10 - 40
+    return (i - 27) * 70 + 140
+
+
+def y_index(y):
+    """Bin of a discretized y0 or y1, values outside the bins use the nearest edge bin."""
+    if y < -180:
+        return max(3 + (y + 180) // 60, 0)
+    if y < 180:
+        return 3 + (y + 180) // 10
+    return min(39 + (y - 180) // 60, Y_BINS - 1)
+
+
+def y_value(i):
+    """Discretized y0 or y1 of a bin."""
+    if i < 3:
+        return i * 60 - 360
+    if i < 39:
+        return (i - 3) * 10 - 180
+    return (i - 39) * 60 + 180
+
+
+def encode_state(x0, y0, vel, y1):
+    """
+    Pack a discretized state into its index.
+    :param x0: discretized x distance to the next pipe
+    :param y0: discretized y distance to the next lower pipe
+    :param vel: bird y velocity
+    :param y1: discretized y distance to the lower pipe after the next
+    :return: state index in [0, N_STATES)
+    """
+    vel_i = min(max(vel - VEL_MIN, 0), VEL_BINS - 1)
+    return ((x_index(x0) * Y_BINS + y_index(y0)) * VEL_BINS + vel_i) * Y_BINS + y_index(y1)
+
+
+# Lookup tables from a truncated raw difference to its bin already multiplied by the bin's stride in the state
+# index, so discretizing and packing a state is four table reads and a sum. Every bucket boundary is an
+# integer, so bucketing the truncated difference matches bucketing the float.
+X_LUT = [x_index(discretize_x(x0)) * Y_BINS * VEL_BINS * Y_BINS for x0 in range(X_RAW_MIN, X_RAW_MAX + 1)]
+Y0_LUT = [y_index(discretize_y(y0)) * VEL_BINS * Y_BINS for y0 in range(Y_RAW_MIN, Y_RAW_MAX + 1)]
+Y1_LUT = [y_index(discretize_y(y1)) for y1 in range(Y_RAW_MIN, Y_RAW_MAX + 1)]
+VEL_LUT = [min(max(vel - VEL_MIN, 0), VEL_BINS - 1) * Y_BINS for vel in range(VEL_MIN, VEL_MIN + VEL_BINS)]
+X_LUT_NP, Y0_LUT_NP, Y1_LUT_NP = (np.array(lut, dtype=np.int64) for lut in (X_LUT, Y0_LUT, Y1_LUT))
+
+
+def discretize_state(x0, y0, vel, y1):
+    """
+    Discretize raw differences and pack them into a state index, same as encode_state of the bucketed values.
+    :param x0: x distance to the next pipe
+    :param y0: y distance to the next lower pipe
+    :param vel: bird y velocity
+    :param y1: y distance to the lower pipe after the next, 0 if unused
+    :return: state index in [0, N_STATES)
+    """
+    return (
+        X_LUT[min(max(int(x0), X_RAW_MIN), X_RAW_MAX) - X_RAW_MIN]
+        + Y0_LUT[min(max(int(y0), Y_RAW_MIN), Y_RAW_MAX) - Y_RAW_MIN]
+        + VEL_LUT[min(max(int(vel) - VEL_MIN, 0), VEL_BINS - 1)]
+        + Y1_LUT[min(max(int(y1), Y_RAW_MIN), Y_RAW_MAX) - Y_RAW_MIN]
+    )
+
+
+def discretize_states(x0, y0, vel, y1):
+    """
+    Batched discretize_state for NumPy arrays of raw differences, such as those of a VectorFlappyEnv.
+    :return: int64 array of state indices
+    """
+    x0, y0, y1 = (np.trunc(np.asarray(v)).astype(np.int64) for v in (x0, y0, y1))
+    vel = np.clip(np.trunc(np.asarray(vel)).astype(np.int64) - VEL_MIN, 0, VEL_BINS - 1)
+    return (
+        X_LUT_NP[np.clip(x0, X_RAW_MIN, X_RAW_MAX) - X_RAW_MIN]
+        + Y0_LUT_NP[np.clip(y0, Y_RAW_MIN, Y_RAW_MAX) - Y_RAW_MIN]
+        + vel * Y_BINS
+        + Y1_LUT_NP[np.clip(y1, Y_RAW_MIN, Y_RAW_MAX) - Y_RAW_MIN]
+    )
+
+
+def decode_state(state):
+    """Returns the (x0, y0, vel, y1) of a state index."""
+    rest, y1_i = divmod(state, Y_BINS)
+    rest, vel_i = divmod(rest, VEL_BINS)
+    x_i, y0_i = divmod(rest, Y_BINS)
+    return x_value(x_i), y_value(y0_i), vel_i + VEL_MIN, y_value(y1_i)
+
+
+def state_key(state):
+    """Returns the "x0_y0_vel_y1" key of a state index used by the json Q-table files."""
+    return "_".join(str(v) for v in decode_state(state))
+
+
+def parse_key(key):
+    """
+    Returns the state index of a "x0_y0_vel_y1" json key.
+    :raises ValueError: if the key is outside the bins and would share an index with another state
+    """
+    values = tuple(int(v) for v in key.split("_"))
+    state = encode_state(*values)
+    if decode_state(state) != values:
+        raise ValueError(f"State {key} is outside the Q-table bins")
+    return state
+
+
+def read_columns(buf):
+    """
+    Returns (states, q, visits) views of a binary table without copying.
+    :param buf: uint8 NumPy array of the whole file, such as an np.memmap
+    :raises ValueError: if buf is not a binary table or was packed with different bins
+    """
+    magic, version, x_bins, y_bins, vel_bins, count = struct.unpack_from(QTABLE_HEADER, buf)
+    if magic != QTABLE_MAGIC or version != QTABLE_VERSION:
+        raise ValueError("Not a binary Q-table")
+    if (x_bins, y_bins, vel_bins) != (X_BINS, Y_BINS, VEL_BINS):
+        raise ValueError("Binary Q-table was saved with different state bins")
+    start = struct.calcsize(QTABLE_HEADER)
+    states = buf[start : start + 4 * count].view("<i4")
+    start += 4 * count
+    q = buf[start : start + 8 * count].view("<f4").reshape(count, 2)
+    start += 8 * count
+    visits = buf[start : start + 4 * count].view("<u4")
+    return states, q, visits
+
+
+class QTable:
+    """
+    Q-values of both actions and the number of visits for every state index.
+
+    Replaces the q_values dict of "x0_y0_vel_y1" keys to [Q of no action, Q of flap action, visits] lists,
+    which is still the json file format.
+    """
+
+    def __init__(self):
+        """Create a table with every Q-value and visit count at 0."""
+        self.q = np.zeros((N_STATES, 2), dtype=np.float32)
+        self.visits = np.zeros(N_STATES, dtype=np.uint32)
+
+    def seen(self):
+        """Returns the indices of states that have been visited or have a Q-value."""
+        return np.flatnonzero(self.visits | self.q.any(axis=1))
+
+    def __len__(self):
+        return len(self.seen())
+
+    @classmethod
+    def from_dict(cls, q_values):
+        """
+        Create a table from a q_values dict.
+        :param q_values: dict of "x0_y0_vel_y1" keys to [Q of no action, Q of flap action, visits]
+        """
+        table = cls()
+        for key, (q0, q1, visits) in q_values.items():
+            state = parse_key(key)
+            table.q[state] = q0, q1
+            table.visits[state] = visits
+        return table
+
+    def to_dict(self):
+        """Returns the seen states as a q_values dict."""
+        return {
+            state_key(state): [float(self.q[state, 0]), float(self.q[state, 1]), int(self.visits[state])]
+            for state in self.seen().tolist()
+        }
+
+    @classmethod
+    def load_json(cls, path):
+        """Load a table from a json q_values file such as data/q_values_resume.json."""
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def save_json(self, path):
+        """Save the seen states to a json q_values file."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    def get(self, state):
+        """Returns the (Q of no action, Q of flap action) of a state."""
+        return self.q.item(state, 0), self.q.item(state, 1)
+
+    def update_backward(self, states, actions, new_states, rewards, alpha, discount):
+        """
+        Q-learning updates of a sequence of moves applied newest first, giving the same float32 Q-values as
+        updating q[state, action] one move at a time.
+        :param states: int array of the state index each action was taken in, oldest move first
+        :param actions: int array of the actions, 0 for do nothing, 1 for flap
+        :param new_states: int array of the state index after each action
+        :param rewards: array of the reward of each move
+        :param alpha: learning rate
+        :param discount: discount factor
+        """
+        rows, _, values = self._backward_values(states, actions, new_states, rewards, alpha, discount)
+        self.q[rows] = values.reshape(-1, 2)
+
+    def _backward_values(self, states, actions, new_states, rewards, alpha, discount):
+        """
+        Returns the rows update_backward touches, the cells of values it updated and the updated values of the rows
+        as a flat float32 array, cell 2 * i + action of values is Q-value action of row i.
+        """
+        # Every update bootstraps from the new state, which is the state the next newer move has just updated,
+        # so the moves cannot be applied as one array operation. Gather the rows they touch into a local float32
+        # array, much cheaper to index than numpy scalars and rounding every write the same way.
+        rows, local = np.unique(np.concatenate((states, new_states)), return_inverse=True)
+        n = len(states)
+        values = array("f", self.q[rows].tobytes())
+        cells = 2 * local[:n] + actions
+        next_cells = (2 * local[n:]).tolist()
+        keep = 1 - alpha
+        for cell, next_cell, reward in zip(reversed(cells.tolist()), reversed(next_cells), reversed(rewards.tolist())):
+            values[cell] = keep * values[cell] + \
+                alpha * (reward + discount * max(values[next_cell], values[next_cell + 1]))
+        return rows, cells, np.frombuffer(values, dtype=np.float32)
+
+    @classmethod
+    def load_binary(cls, path):
+        """Load a table from a binary file, see save_binary."""
+        table = cls()
+        states, q, visits = read_columns(np.memmap(path, dtype=np.uint8, mode="r"))
+        table.q[states] = q
+        table.visits[states] = visits
+        return table
+
+    def save_binary(self, path):
+        """
+        Save the seen states to a binary file. The file is written next to path and then moved over it, so
+        processes that have the old file mapped keep reading a consistent table.
+        """
+        states = self.seen()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(QTABLE_HEADER, QTABLE_MAGIC, QTABLE_VERSION, X_BINS, Y_BINS, VEL_BINS, len(states)))
+            f.write(states.astype("<i4").tobytes())
+            f.write(self.q[states].astype("<f4").tobytes())
+            f.write(self.visits[states].astype("<u4").tobytes())
+        os.replace(tmp_path, path)
+
+
+class SharedQTable(QTable):
+    """
+    QTable in a multiprocessing shared memory block, the Q-values then the visit counts. Every process that attaches
+    to the block by name reads and updates the same table with nothing copied or sent between them.
+
+    Nothing is locked, Hogwild training accepts lost updates in exchange for never waiting, see
+    https://arxiv.org/abs/1106.5730. update_backward reads every Q-value an episode needs before updating any, so it
+    bootstraps from values other processes may have changed since, and when another process updates the same
+    Q-value meanwhile one of the two updates is lost. Only the Q-values the episode updated are written back, the
+    updates other processes make to any other Q-value are kept. Visit counts can miss concurrent increments.
+    """
+
+    def __init__(self, name=None):
+        """
+        Create a table with every Q-value and visit count at 0, or attach to an existing one.
+        :param name: name of the shared memory block of a table to attach to, None to create a new block
+        """
+        if shared_memory is None:
+            raise RuntimeError("SharedQTable needs multiprocessing.shared_memory, added in Python 3.8")
+        size = N_STATES * (2 * np.dtype(np.float32).itemsize + np.dtype(np.uint32).itemsize)
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.q = np.ndarray((N_STATES, 2), dtype=np.float32, buffer=self.memory.buf)
+        self.visits = np.ndarray(N_STATES, dtype=np.uint32, buffer=self.memory.buf, offset=self.q.nbytes)
+
+    @property
+    def name(self):
+        """Name of the shared memory block, to attach to the table from another process."""
+        return self.memory.name
+
+    def update_backward(self, states, actions, new_states, rewards, alpha, discount):
+        """QTable.update_backward writing back only the Q-values it updated, rather than every row it read."""
+        rows, cells, values = self._backward_values(states, actions, new_states, rewards, alpha, discount)
+        cells = np.unique(cells)
+        self.q.reshape(-1)[2 * rows[cells >> 1] + (cells & 1)] = values[cells]
+
+    def to_table(self):
+        """Returns a QTable copy of the shared table."""
+        table = QTable()
+        table.q[:] = self.q
+        table.visits[:] = self.visits
+        return table
+
+    def close(self):
+        """Detach from the block, the table can no longer be used in this process."""
+        self.q = self.visits = None  # the block cannot be closed while arrays still use it
+        self.memory.close()
+
+    def unlink(self):
+        """Free the block once every process has closed it, call once from the process that created it."""
+        self.memory.unlink()
+
+
+class MappedQTable:
+    """
+    Read only Q-table over a memory-mapped binary file. Opening it only reads the header, and processes that
+    map the same file share its pages, so evaluation runs don't each hold their own copy of the table.
+    States are found with a binary search of the sorted state column, unseen states have Q-values of 0.
+    """
+
+    def __init__(self, path):
+        """
+        Map a binary table.
+        :param path: path of a file written by QTable.save_binary
+        """
+        # Plain ndarray views of the map skip np.memmap's per call overhead, the views keep the map open
+        buf = np.memmap(path, dtype=np.uint8, mode="r").view(np.ndarray)
+        self.states, self.q, self.visits = read_columns(buf)
+
+    def __len__(self):
+        return len(self.states)
+
+    def get(self, state):
+        """Returns the (Q of no action, Q of flap action) of a state."""
+        i = int(self.states.searchsorted(np.int32(state)))  # search with a matching dtype, not a Python int
+        if i < len(self.states) and self.states[i] == state:
+            return self.q.item(i, 0), self.q.item(i, 1)
+        return 0.0, 0.0
+
+    def to_table(self):
+        """Returns a writable QTable copy of the mapped table."""
+        table = QTable()
+        table.q[self.states] = self.q
+        table.visits[self.states] = self.visits
+        return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert Q-tables between json and the binary format.")
+    parser.add_argument("paths", nargs="+", help="json tables to convert to .qtable, or .qtable files to json")
+    args = parser.parse_args()
+    for path in args.paths:
+        root, ext = os.path.splitext(path)
+        if ext == ".json":
+            table = QTable.load_json(path)
+            table.save_binary(root + ".qtable")
+            print(f"{path} -> {root}.qtable ({len(table)} states)")
+        else:
+            table = QTable.load_binary(path)
+            table.save_json(root + ".json")
+            print(f"{path} -> {root}.json ({len(table)} states)")
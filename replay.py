@@ -0,0 +1,203 @@
+"""
+Experience replay: prioritized replay of single transitions, and a store of whole failed attempts.
+
+Transitions are (state, action, reward, new state) rows in fixed size numpy arrays used as a ring, so the
+buffer never grows past its capacity and the oldest transitions are evicted first. Each transition is sampled
+with probability proportional to its priority, (|TD error| + eps) ** alpha, kept in a sum-tree so sampling a
+batch and updating its priorities is O(batch log capacity). See https://arxiv.org/abs/1511.05952.
+
+AttemptStore keeps the moves of failed resume attempts to replay as whole episodes, see flappy_rl.REPLAY_BUFFER.
+"""
+import random
+
+import numpy as np
+
+
+class SumTree:
+    """
+    Binary tree of sums over leaf priorities, stored as an array: node i has children 2i and 2i + 1, the root
+    is node 1 and leaf j is node size + j.
+    """
+
+    def __init__(self, capacity):
+        """
+        Create a tree with every priority at 0.
+        :param capacity: number of leaves
+        """
+        self.size = 1 << max(capacity - 1, 0).bit_length()
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    @property
+    def total(self):
+        """Sum of every priority."""
+        return self.tree[1]
+
+    def get(self, leaves):
+        """Returns the priorities of an array of leaf indices."""
+        return self.tree[leaves + self.size]
+
+    def update(self, leaves, priorities):
+        """
+        Set the priorities of leaves and the sums above them, one array operation per level.
+        :param leaves: array of leaf indices
+        :param priorities: array of the new priorities
+        """
+        nodes = leaves + self.size
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes >> 1)
+        while nodes[0]:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes >> 1)
+
+    def find(self, values):
+        """
+        Returns the leaf of each value, the first leaf whose cumulative priority is greater than the value.
+        :param values: array of values in [0, total)
+        """
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        while nodes[0] < self.size:
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            right = values >= left_sums
+            values -= np.where(right, left_sums, 0)
+            nodes = left + right
+        return nodes - self.size
+
+
+class PrioritizedReplay:
+    """Ring buffer of transitions sampled by priority."""
+
+    def __init__(self, capacity, alpha=0.6, beta=0.4, eps=0.01, seed=None):
+        """
+        Create an empty buffer.
+        :param capacity: maximum number of transitions held, the oldest are evicted first
+        :param alpha: how much priorities count, 0 samples uniformly
+        :param beta: importance sampling correction, 1 fully corrects for the non uniform sampling
+        :param eps: added to every |TD error| so every transition can still be sampled
+        :param seed: seed of the sampling random generator
+        """
+        self.capacity = capacity
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.new_states = np.zeros(capacity, dtype=np.int32)
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0  # priority of new transitions, so each is sampled at least once in a while
+        self.head = 0  # slot of the next transition
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, states, actions, rewards, new_states):
+        """
+        Add transitions with the highest priority seen so far, evicting the oldest if the buffer is full.
+        :param states: array of state indices
+        :param actions: array of actions
+        :param rewards: array of rewards
+        :param new_states: array of the state indices after each action
+        """
+        n = len(states)
+        if n > self.capacity:
+            states, actions, rewards, new_states = (
+                states[-self.capacity:], actions[-self.capacity:], rewards[-self.capacity:],
+                new_states[-self.capacity:],
+            )
+            n = self.capacity
+        slots = (self.head + np.arange(n)) % self.capacity
+        self.states[slots] = states
+        self.actions[slots] = actions
+        self.rewards[slots] = rewards
+        self.new_states[slots] = new_states
+        self.tree.update(slots, np.full(n, self.max_priority))
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Returns (slots, weights) of a batch sampled by priority, one sample from each equal slice of the total
+        priority. weights are the importance sampling weights scaled so the largest is 1.
+        :param batch_size: number of transitions to sample
+        """
+        bounds = np.linspace(0, self.tree.total, batch_size + 1)
+        values = self.rng.uniform(bounds[:-1], bounds[1:])
+        # float error can land past the last non zero leaf, keep slots within the filled part
+        slots = np.minimum(self.tree.find(values), self.count - 1)
+        probabilities = self.tree.get(slots) / self.tree.total
+        weights = (self.count * probabilities) ** -self.beta
+        return slots, weights / weights.max()
+
+    def update_priorities(self, slots, errors):
+        """
+        Set the priorities of sampled transitions from their new TD errors.
+        :param slots: slots returned by sample
+        :param errors: array of TD errors
+        """
+        priorities = (np.abs(errors) + self.eps) ** self.alpha
+        self.tree.update(slots, priorities)
+        self.max_priority = max(self.max_priority, priorities.max())
+
+
+class AttemptStore:
+    """
+    Failed attempts of (state, action, new state) moves stored back to back in contiguous arrays, with the
+    offset where each attempt starts. Adding an attempt is one copy per column and an attempt is read back as
+    array views, so nothing is copied to replay it.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        """
+        Create an empty store.
+        :param capacity: moves to allocate for, the arrays double in size when full
+        """
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.new_states = np.zeros(capacity, dtype=np.int32)
+        self.offsets = [0]  # attempt i is moves [offsets[i], offsets[i + 1])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def append(self, states, actions, new_states):
+        """
+        Add an attempt.
+        :param states: array of the state index of each move, oldest first
+        :param actions: array of the actions
+        :param new_states: array of the state index after each action
+        """
+        start = self.offsets[-1]
+        stop = start + len(states)
+        if stop > len(self.states):
+            size = max(stop, 2 * len(self.states))
+            for name in ("states", "actions", "new_states"):
+                column = getattr(self, name)
+                grown = np.zeros(size, dtype=column.dtype)
+                grown[:start] = column[:start]
+                setattr(self, name, grown)
+        self.states[start:stop] = states
+        self.actions[start:stop] = actions
+        self.new_states[start:stop] = new_states
+        self.offsets.append(stop)
+
+    def attempt(self, i):
+        """Returns views of the (states, actions, new states) arrays of attempt i."""
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.states[start:stop], self.actions[start:stop], self.new_states[start:stop]
+
+    def sample(self, k):
+        """
+        Returns up to k different attempts in a random order.
+        :param k: number of attempts
+        """
+        order = list(range(len(self)))
+        random.shuffle(order)
+        return [self.attempt(i) for i in reversed(order[-k:])] if k else []
+
+    def clear(self):
+        """Remove every attempt, the arrays are kept for the next attempts."""
+        self.offsets = [0]
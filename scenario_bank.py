@@ -0,0 +1,187 @@
+"""
+On-disk bank of difficult game scenarios to practise.
+
+A scenario is the oldest snapshot of a resume history (see snapshots.SnapshotRing), the pipes that spawned
+after it, the score that counts as getting past it, and counts of the deaths and passes it has seen. Scenarios
+are fixed size records in one file, so the bank survives restarts, and every read and update takes a file lock so
+several training processes can share it. Scenarios are sampled in proportion to deaths / (passes + 1), the ones
+the agent keeps failing are practised the most.
+
+The bank holds at most capacity scenarios. Adding a scenario already in the bank counts a death of it instead,
+and once the bank is full a new scenario replaces the one with the lowest weight, the one most often passed. A
+process still playing a replaced scenario counts its death or pass for the scenario that replaced it.
+
+File format: a 24 byte header of magic, format version, record size, capacity and number of scenarios, an index
+of capacity (deaths, passes, key) entries, then the records. Sampling only reads the header and the index.
+"""
+import hashlib
+import os
+import random
+import struct
+
+import numpy as np
+
+from snapshots import SNAPSHOT_RECORD, restore_snapshot
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows, the bank is then only safe to use from one process
+    fcntl = None
+
+SCENARIO_HEADER = struct.Struct("<8sHHII4x")
+SCENARIO_MAGIC = b"FLAPSCEN"
+SCENARIO_VERSION = 2
+# Pipes are 144px apart and scroll 4px a frame, so at most 2 spawn in a 70 frame history, keep spare room
+MAX_SPAWNS = 4
+# snapshot, score to beat, number of spawns, then (upper y, lower y) of each spawn
+SCENARIO_RECORD = struct.Struct(f"<{SNAPSHOT_RECORD.size}sqB7x{2 * MAX_SPAWNS}q")
+# Index entry of a scenario: deaths, passes and a hash of its record to find it again when it is added twice
+SCENARIO_INDEX = np.dtype([("deaths", "<u4"), ("passes", "<u4"), ("key", "<u8")])
+
+
+class ScenarioBank:
+    """Difficult scenarios in a file shared by every process that opens it."""
+
+    def __init__(self, path, capacity=1024):
+        """
+        Open a bank, creating the file if it does not exist.
+        :param path: path of the bank file
+        :param capacity: most scenarios kept by a new bank, an existing bank keeps the capacity it was created with
+        """
+        self.path = path
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b", buffering=0)
+        with self._lock():
+            if self._size() == 0:
+                self.file.write(SCENARIO_HEADER.pack(SCENARIO_MAGIC, SCENARIO_VERSION, SCENARIO_RECORD.size,
+                                                     capacity, 0))
+                self.file.write(bytes(capacity * SCENARIO_INDEX.itemsize))
+            else:
+                magic, version, size, capacity, _ = SCENARIO_HEADER.unpack(self._read_at(SCENARIO_HEADER.size, 0))
+                if magic != SCENARIO_MAGIC or version != SCENARIO_VERSION or size != SCENARIO_RECORD.size:
+                    raise ValueError(f"{path} is not a version {SCENARIO_VERSION} scenario bank")
+        self.capacity = capacity
+        self.records_start = SCENARIO_HEADER.size + capacity * SCENARIO_INDEX.itemsize
+
+    def _lock(self, shared=False):
+        """Returns a context manager holding a lock on the whole file."""
+        return _FileLock(self.file.fileno(), shared)
+
+    def _size(self):
+        """Returns the size of the file in bytes."""
+        return os.fstat(self.file.fileno()).st_size
+
+    def _read_at(self, n, offset):
+        """Returns n bytes read at offset, hold a lock while calling this."""
+        self.file.seek(offset)
+        return self.file.read(n)
+
+    def _write_at(self, data, offset):
+        """Write data at offset, hold an exclusive lock while calling this."""
+        self.file.seek(offset)
+        self.file.write(data)
+
+    def _count_scenarios(self):
+        """Returns the number of scenarios, hold a lock while calling this."""
+        return SCENARIO_HEADER.unpack(self._read_at(SCENARIO_HEADER.size, 0))[4]
+
+    def _index(self):
+        """Returns the index entries of every scenario as a SCENARIO_INDEX array, hold a lock while calling this."""
+        n = self._count_scenarios()
+        data = self._read_at(n * SCENARIO_INDEX.itemsize, SCENARIO_HEADER.size)
+        return np.frombuffer(data, dtype=SCENARIO_INDEX, count=n)
+
+    def __len__(self):
+        with self._lock(shared=True):
+            return self._count_scenarios()
+
+    def add(self, history):
+        """
+        Add the scenario starting at the oldest snapshot of a resume history, counted as one death.
+        :param history: SnapshotRing of the frames before the bird died
+        :return: index of the scenario
+        """
+        spawns = history.spawns(0)[:MAX_SPAWNS]
+        spawn_ys = [y for spawn in spawns for y in spawn] + [0] * (2 * (MAX_SPAWNS - len(spawns)))
+        record = SCENARIO_RECORD.pack(history.record(0), history.score(-1), len(spawns), *spawn_ys)
+        key = int.from_bytes(hashlib.blake2b(record, digest_size=8).digest(), "little")
+        with self._lock():
+            index = self._index()
+            found = np.flatnonzero(index["key"] == key)
+            if len(found):
+                i = int(found[0])
+                self._increment(i, "deaths")
+                return i
+            if len(index) < self.capacity:
+                i = len(index)
+                self._write_at(SCENARIO_HEADER.pack(SCENARIO_MAGIC, SCENARIO_VERSION, SCENARIO_RECORD.size,
+                                                    self.capacity, i + 1), 0)
+            else:
+                i = int(np.argmin(index["deaths"] / (index["passes"] + 1.0)))
+            self._write_at(record, self.records_start + i * SCENARIO_RECORD.size)
+            self._write_at(np.array([(1, 0, key)], dtype=SCENARIO_INDEX).tobytes(),
+                           SCENARIO_HEADER.size + i * SCENARIO_INDEX.itemsize)
+        return i
+
+    def _increment(self, i, field):
+        """Add one to the deaths or passes of scenario i, hold an exclusive lock while calling this."""
+        offset = SCENARIO_HEADER.size + i * SCENARIO_INDEX.itemsize + SCENARIO_INDEX.fields[field][1]
+        (count,) = struct.unpack("<I", self._read_at(4, offset))
+        self._write_at(struct.pack("<I", count + 1), offset)
+
+    def record_death(self, i):
+        """Count a death in scenario i."""
+        with self._lock():
+            self._increment(i, "deaths")
+
+    def record_pass(self, i):
+        """Count a pass of scenario i."""
+        with self._lock():
+            self._increment(i, "passes")
+
+    def sample(self, rng=random):
+        """
+        Returns the index of a scenario sampled in proportion to deaths / (passes + 1), None if the bank is empty.
+        :param rng: random generator to sample with
+        """
+        with self._lock(shared=True):
+            index = self._index()
+        if not len(index):
+            return None
+        weights = index["deaths"] / (index["passes"] + 1.0)
+        return rng.choices(range(len(index)), weights=weights.tolist())[0]
+
+    def restore(self, i, pipes):
+        """
+        Restore scenario i.
+        :param i: index of the scenario
+        :param pipes: PipeRing to overwrite with the pipes of the scenario
+        :return: (playerx, playery, playerVelY, score, playerIndex) to start from, the score to beat to pass the
+            scenario and the (upper y, lower y) of the pipes to spawn next
+        """
+        offset = self.records_start + i * SCENARIO_RECORD.size
+        with self._lock(shared=True):
+            data = self._read_at(SCENARIO_RECORD.size, offset)
+        record = SCENARIO_RECORD.unpack(data)
+        player = restore_snapshot(record[0], 0, pipes)
+        spawn_ys = record[3:]
+        return player, record[1], [tuple(spawn_ys[2 * k:2 * k + 2]) for k in range(record[2])]
+
+    def close(self):
+        """Close the bank file."""
+        self.file.close()
+
+
+class _FileLock:
+    """flock held for the duration of a with block, a no-op where there is no fcntl."""
+
+    def __init__(self, fd, shared):
+        self.fd = fd
+        self.shared = shared
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
@@ -0,0 +1,119 @@
+"""
+Packed game snapshots for resuming training from a difficult segment.
+
+A snapshot is the player position, velocity, score and animation frame plus the raw slots of the PipeRing,
+packed into one fixed size struct record. SnapshotRing keeps the newest records in a preallocated bytearray, so
+recording a frame is a single pack_into with nothing allocated, and restoring a snapshot is a single call that
+writes the pipes back into an existing ring.
+"""
+import struct
+from array import array
+
+from pipes import PIPE_CAPACITY
+
+# playerx, playery, playerVelY, score, playerIndex, then the pipe ring offset, head and count and its slots of
+# pipe x (relative to the offset), upper y and lower y
+SNAPSHOT_RECORD = struct.Struct(f"<qdqqqqqq{PIPE_CAPACITY}d{PIPE_CAPACITY}q{PIPE_CAPACITY}q")
+
+
+class SnapshotRing:
+    """The newest snapshots of a game, snapshot i (0 is the oldest) is in slot (head + i) % size."""
+
+    def __init__(self, size=70):
+        """
+        Create an empty ring.
+        :param size: number of snapshots kept, the oldest are overwritten
+        """
+        self.size = size
+        self.buffer = bytearray(size * SNAPSHOT_RECORD.size)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, i):
+        """Returns the byte offset of snapshot i, negative i counts from the newest."""
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("snapshot index out of range")
+        return (self.head + i) % self.size * SNAPSHOT_RECORD.size
+
+    def append(self, playerx, playery, playerVelY, pipes, score, playerIndex):
+        """
+        Record a frame, overwriting the oldest snapshot if the ring is full.
+        :param pipes: PipeRing of the pipes on screen, copied into the record
+        """
+        if self.count == self.size:
+            slot = self.head
+            self.head = (self.head + 1) % self.size
+        else:
+            slot = (self.head + self.count) % self.size
+            self.count += 1
+        SNAPSHOT_RECORD.pack_into(
+            self.buffer, slot * SNAPSHOT_RECORD.size, playerx, playery, playerVelY, score, playerIndex,
+            pipes.offset, pipes.head, pipes.count, *pipes.xs, *pipes.upperYs, *pipes.lowerYs,
+        )
+
+    def clear(self):
+        """Remove every snapshot."""
+        self.head = 0
+        self.count = 0
+
+    def score(self, i):
+        """Returns the score of snapshot i."""
+        return SNAPSHOT_RECORD.unpack_from(self.buffer, self._offset(i))[3]
+
+    def record(self, i):
+        """Returns the packed SNAPSHOT_RECORD bytes of snapshot i."""
+        offset = self._offset(i)
+        return bytes(self.buffer[offset:offset + SNAPSHOT_RECORD.size])
+
+    def restore(self, i, pipes):
+        """
+        Restore snapshot i.
+        :param i: index of the snapshot
+        :param pipes: PipeRing to overwrite with the pipes of the snapshot
+        :return: (playerx, playery, playerVelY, score, playerIndex) of the snapshot
+        """
+        return restore_snapshot(self.buffer, self._offset(i), pipes)
+
+    def spawns(self, i):
+        """
+        Returns the (upper y, lower y) of every pipe that spawned after snapshot i, oldest first. Replaying them
+        in order from a restored snapshot gives the game the same pipes the snapshots saw.
+        """
+        n = PIPE_CAPACITY
+        newest = None  # x relative to the offset of the newest pipe, later pipes spawn further right
+        spawned = []
+        for j in range(i, self.count):
+            record = SNAPSHOT_RECORD.unpack_from(self.buffer, self._offset(j))
+            head, count = record[6], record[7]
+            for k in range(count):
+                slot = (head + k) % n
+                x = record[8 + slot]
+                if newest is not None and x <= newest:
+                    continue
+                if j > i:
+                    spawned.append((record[8 + n + slot], record[8 + 2 * n + slot]))
+                newest = x
+        return spawned
+
+
+def restore_snapshot(buffer, offset, pipes):
+    """
+    Restore a packed snapshot record.
+    :param buffer: bytes like object holding the record
+    :param offset: byte offset of the record in buffer
+    :param pipes: PipeRing to overwrite with the pipes of the snapshot
+    :return: (playerx, playery, playerVelY, score, playerIndex) of the snapshot
+    """
+    record = SNAPSHOT_RECORD.unpack_from(buffer, offset)
+    n = PIPE_CAPACITY
+    pipes.offset, pipes.head, pipes.count = record[5:8]
+    pipes.xs[:] = array("d", record[8:8 + n])
+    pipes.upperYs[:] = array("q", record[8 + n:8 + 2 * n])
+    pipes.lowerYs[:] = array("q", record[8 + 2 * n:])
+    playerx, playery, playerVelY, score, playerIndex = record[:5]
+    return playerx, int(playery) if playery.is_integer() else playery, playerVelY, score, playerIndex
@@ -0,0 +1,88 @@
+"""Packed hitmasks and collision tables against the original list-of-lists pixel collision."""
+import os
+
+import pygame
+import pytest
+
+from collision import CollisionTable, flipHitmask, getHitmask, loadHitmask, loadSprite, pixelCollision
+
+SPRITES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "sprites")
+PLAYERS = [f"{bird}bird-{flap}flap.png" for bird in ("red", "blue", "yellow") for flap in ("up", "mid", "down")]
+PIPES = ["pipe-green.png", "pipe-red.png"]
+
+
+def _getHitmask(image):
+    """The original hitmask, a list of columns of booleans."""
+    mask = []
+    for x in range(image.get_width()):
+        mask.append([])
+        for y in range(image.get_height()):
+            mask[x].append(bool(image.get_at((x, y))[3]))
+    return mask
+
+
+def _pixelCollision(rect1, rect2, hitmask1, hitmask2):
+    """The original pixel collision over list-of-lists hitmasks."""
+    rect = rect1.clip(rect2)
+
+    if rect.width == 0 or rect.height == 0:
+        return False
+
+    x1, y1 = rect.x - rect1.x, rect.y - rect1.y
+    x2, y2 = rect.x - rect2.x, rect.y - rect2.y
+
+    for x in range(rect.width):
+        for y in range(rect.height):
+            if hitmask1[x1 + x][y1 + y] and hitmask2[x2 + x][y2 + y]:
+                return True
+    return False
+
+
+def _pipes():
+    """Yields (name, surface, packed hitmask) of every pipe as drawn: lower, flipped upper and rotated upper."""
+    for name in PIPES:
+        pipe = loadSprite(os.path.join(SPRITES, name), headless=True)
+        mask = getHitmask(pipe)
+        width = pipe.get_width()
+        yield f"{name} lower", pipe, mask
+        # environment.FlappyGame flips the upper pipe, flappy_rl rotates it
+        yield f"{name} flipped", pygame.transform.flip(pipe, False, True), flipHitmask(mask, width, False, True)
+        yield f"{name} rotated", pygame.transform.rotate(pipe, 180), flipHitmask(mask, width, True, True)
+
+
+@pytest.mark.parametrize("player", PLAYERS)
+def test_packed_collision_matches_original(player):
+    playerImage = loadSprite(os.path.join(SPRITES, player), headless=True)
+    playerMask, oldPlayerMask = getHitmask(playerImage), _getHitmask(playerImage)
+    playerW, playerH = playerImage.get_size()
+    playerRect = pygame.Rect(0, 0, playerW, playerH)
+
+    for name, pipeImage, pipeMask in _pipes():
+        # the packed mask of a transformed pipe must be the mask of the transformed image
+        assert pipeMask == getHitmask(pipeImage), name
+        oldPipeMask = _getHitmask(pipeImage)
+        pipeW, pipeH = pipeImage.get_size()
+        table = CollisionTable(playerMask, (playerW, playerH), pipeMask, (pipeW, pipeH), cacheDir=None)
+
+        # every offset where the rects overlap, plus one past each edge
+        for dx in range(-pipeW, playerW + 1):
+            for dy in range(-pipeH, playerH + 1):
+                pipeRect = pygame.Rect(dx, dy, pipeW, pipeH)
+                expected = _pixelCollision(playerRect, pipeRect, oldPlayerMask, oldPipeMask)
+                assert pixelCollision(playerRect, pipeRect, playerMask, pipeMask) == expected, (name, dx, dy)
+                assert table.collides(dx, dy) == expected, (name, dx, dy)
+
+
+@pytest.mark.parametrize("keep", [0, 3, 100])
+def test_incomplete_hitmask_cache_is_rebuilt(tmp_path, keep):
+    path = os.path.join(SPRITES, PIPES[0])
+    expected = getHitmask(loadSprite(path, headless=True))
+    assert loadHitmask(path, cacheDir=str(tmp_path)) == expected
+    (cachePath,) = tmp_path.iterdir()
+
+    # an empty, header only or truncated cache file must be rebuilt, not read
+    data = cachePath.read_bytes()
+    cachePath.write_bytes(data[:keep])
+    assert loadHitmask(path, cacheDir=str(tmp_path)) == expected
+    assert cachePath.read_bytes() == data
+    assert [p.name for p in tmp_path.iterdir()] == [cachePath.name]  # no temporary file left behind
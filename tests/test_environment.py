@@ -0,0 +1,11 @@
+"""Headless FlappyGame."""
+import pytest
+
+from environment import FlappyGame
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_frame_step_n_needs_a_frame(k):
+    game = FlappyGame(headless=True)
+    with pytest.raises(ValueError):
+        game.frame_step_n(1, k)
@@ -0,0 +1,172 @@
+"""QLearning and QLambda agents, trained on synthetic move sequences."""
+import random
+
+import numpy as np
+import pytest
+
+from environment import FlappyGame
+from q_learning import QLambda, QLearning
+from q_table import N_STATES, decode_state
+from replay import AttemptStore
+
+
+def _agent(**kwargs):
+    """Training agent with an empty table, keeping its episode log in memory."""
+    return QLearning(True, load=False, log_path=None, **kwargs)
+
+
+def _play(agent, states, actions):
+    """Store the moves of an episode as act does, then end it with a death."""
+    for state, action in zip(states, actions):
+        agent.store_move(state)
+        agent.previous_state, agent.previous_action = state, action
+    agent.update_qvalues(len(states))
+
+
+@pytest.mark.parametrize("length", [10, 64, 65, 500])
+def test_online_counts_every_visit(length):
+    rng = random.Random(length)
+    episodes = [([rng.randrange(N_STATES) for _ in range(length)], [rng.randrange(2) for _ in range(length)])
+                for _ in range(3)]
+    online, offline = _agent(online=True), _agent()
+    for states, actions in episodes:
+        _play(online, states, actions)
+        _play(offline, states, actions)
+    assert online.q_values.visits.sum() == 3 * length
+    np.testing.assert_array_equal(online.q_values.visits, offline.q_values.visits)
+    assert [record['episode'] for record in online.log.drain()] == [1, 2, 3]
+    assert online.log.drain() == []
+
+
+
+def _old_update(q, visits, moves, alpha, discount, reward, die):
+    """
+    The per-move loop update_backward replaced, newest first: with the death penalties of update_qvalues, or with
+    the reward for not dying of flush_moves.
+    """
+    high_death_flag = True if die and decode_state(moves[-1][2])[1] > 120 else False
+    t, last_flap = 0, True
+    for state, action, new_state in reversed(moves):
+        t += 1
+        curr_reward = reward[0]
+        if die:
+            visits[state] += 1
+            if t <= 2:
+                curr_reward = reward[1]
+                if action:
+                    last_flap = False
+            elif (last_flap or high_death_flag) and action:
+                curr_reward = reward[1]
+                last_flap = False
+                high_death_flag = False
+        q[state, action] = (1 - alpha) * q.item(state, action) + \
+            alpha * (curr_reward + discount * max(q.item(new_state, 0), q.item(new_state, 1)))
+
+
+def _recorded_episodes(n, seed):
+    """Episodes of (state, action) recorded from a headless game flapping at random."""
+    random.seed(seed)
+    rng = random.Random(seed)
+    agent, game = _agent(), FlappyGame(headless=True)
+    episodes, episode = [], []
+    while len(episodes) < n:
+        state = agent.get_state(game.playerx, game.playery, game.playerVelY, game.pipes)
+        action = 1 if rng.random() < 0.1 else 0
+        episode.append((state, action))
+        _, _, done = game.frame_step(action, draw=False)
+        if done:
+            episodes.append(episode)
+            episode = []
+    return episodes
+
+
+def _random_episodes(n, seed):
+    """Episodes of (state, action) drawn from a few states, so most states repeat within an episode."""
+    rng = random.Random(seed)
+    pool = [rng.randrange(N_STATES) for _ in range(20)]
+    return [[(rng.choice(pool), rng.randrange(2)) for _ in range(rng.randrange(3, 300))] for _ in range(n)]
+
+
+@pytest.mark.parametrize("history", ["recorded", "random"])
+@pytest.mark.parametrize("flush", [0, 1, 7, 100])
+def test_update_backward_matches_per_move_loop(history, flush):
+    episodes = _recorded_episodes(6, 0) if history == "recorded" else _random_episodes(6, flush)
+    agent = _agent()
+    q, visits = agent.q_values.q.copy(), agent.q_values.visits.copy()
+    moves = []
+    for episode in episodes:
+        for state, action in episode:
+            agent.store_move(state)
+            moves.append((agent.previous_state, agent.previous_action, state))
+            agent.previous_state, agent.previous_action = state, action
+            if flush and len(moves) > flush:
+                # A partial flush of the oldest moves, as reduce_moves does when the history gets long
+                _old_update(q, visits, moves[:flush], agent.alpha, agent.discount_factor, agent.reward, False)
+                agent.reduce_moves(flush)
+                del moves[:flush]
+        _old_update(q, visits, moves, agent.alpha, agent.discount_factor, agent.reward, True)
+        agent.update_qvalues(len(episode))
+        moves.clear()
+    assert q.any()
+    # Equal bit for bit, the float32 values are rounded the same way after every move
+    np.testing.assert_array_equal(agent.q_values.q.view(np.uint32), q.view(np.uint32))
+    np.testing.assert_array_equal(agent.q_values.visits, visits)
+
+def test_q_lambda_penalises_the_moves_qlearning_does():
+    agent = QLambda(True, load=False, log_path=None)
+    states = list(range(1000, 1040))
+    actions = [0] * 40
+    actions[30] = 1  # the flap before a fall into the lower pipe
+    _play(agent, states, actions)
+    q = agent.q_values.q
+    assert (q[states[-3:-1], 0] < 0).all() and q[states[30], 1] < 0  # the last move is stored by the next one
+    # The moves before the flap could still have flapped, so dying after it does not penalise them
+    assert not q[states[:30]].any()
+    assert agent.q_values.visits[states[:-1]].tolist() == [1] * 39
+
+
+def test_q_lambda_traces_carry_the_death_penalty():
+    agent = QLambda(True, load=False, log_path=None)
+    states = list(range(1000, 1060))
+    agent.q_values.q[states, 1] = -2000  # flapping is worse everywhere, not flapping stays greedy
+    alpha, decay = agent.alpha, agent.discount_factor * agent.lam
+    _play(agent, states, [0] * 60)
+    # The crash move and the one before it are penalised, every older traced move gets their decayed TD errors.
+    # The last state is the death state, the crash move is made from the one before it.
+    ages = np.arange(agent.trace_len, -1, -1)
+    expected = -alpha * 1000 * (decay ** ages + np.where(ages > 0, decay ** (ages - 1.0), 0))
+    np.testing.assert_allclose(agent.q_values.q[states[-agent.trace_len - 2:-1], 0], expected, rtol=1e-5)
+    assert not agent.q_values.q[states[:-agent.trace_len - 2] + states[-1:], 0].any()
+
+
+def test_q_lambda_options():
+    assert QLambda(True, load=False, log_path=None, replay_capacity=100).replay is not None
+    with pytest.raises(ValueError):
+        QLambda(True, load=False, log_path=None, online=True)
+
+
+@pytest.mark.parametrize("attempts", [1, 5, 7])
+def test_replay_round_counts_like_attempt_replay(attempts):
+    rng = random.Random(attempts)
+    prioritized, plain, stored = _agent(replay_capacity=1000), _agent(), AttemptStore()
+    for _ in range(attempts):
+        states = [rng.randrange(N_STATES) for _ in range(20)]
+        actions = [rng.randrange(2) for _ in range(20)]
+        for agent in (prioritized, plain):
+            for state, action in zip(states, actions):
+                agent.store_move(state)
+                agent.previous_state, agent.previous_action = state, action
+        prioritized.store_attempt()
+        stored.append(*plain.move_arrays(len(plain.moves)))
+        plain.clear_moves()
+    # The two ways flappy_rl resolves a resume loop
+    prioritized.replay_updates(42)
+    for moves in stored.sample(5):
+        plain.update_qvalues(42, moves)
+
+    def fields(agent):
+        return [(r['episode'], r['score'], r['max_score'], r['alpha']) for r in agent.log.drain()]
+
+    assert prioritized.episode == plain.episode == min(attempts, 5)
+    assert prioritized.alpha == plain.alpha and prioritized.scores == plain.scores
+    assert fields(prioritized) == fields(plain)
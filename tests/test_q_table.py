@@ -0,0 +1,115 @@
+"""Dense Q-table: state discretization against the original bucketing of QLearning.get_state, shared tables."""
+import numpy as np
+import pytest
+
+from q_table import QTable, SharedQTable, decode_state, discretize_state, discretize_states, encode_state
+
+
+def _bucket(x0, y0, vel, y1):
+    """The original branch and modulo bucketing of QLearning.get_state, as the ints of its json key."""
+    if x0 < -40:
+        x0 = int(x0)
+    elif x0 < 140:
+        x0 = int(x0) - (int(x0) % 10)
+    else:
+        x0 = int(x0) - (int(x0) % 70)
+
+    if -180 < y0 < 180:
+        y0 = int(y0) - (int(y0) % 10)
+    else:
+        y0 = int(y0) - (int(y0) % 60)
+
+    if -180 < y1 < 180:
+        y1 = int(y1) - (int(y1) % 10)
+    else:
+        y1 = int(y1) - (int(y1) % 60)
+
+    return int(x0), int(y0), int(vel), int(y1)
+
+
+# Raw differences around every bucket edge (-50, -40, 140 for x0 and +-180 for y), as ints and floats either side
+EDGES_X = [-50, -49, -40, 0, 140, 210]
+EDGES_Y = [-360, -180, 0, 180, 240]
+OFFSETS = [-1.5, -1, -0.75, -0.5, -0.25, 0, 0.25, 0.5, 0.75, 1, 1.5]
+X_VALUES = sorted(
+    {e + o for e in EDGES_X for o in OFFSETS} | set(range(-49, 631)) | {x + 0.5 for x in range(-49, 630)}
+)
+Y_VALUES = sorted(
+    {e + o for e in EDGES_Y for o in OFFSETS} | set(range(-360, 600)) | {y + 0.5 for y in range(-360, 599)}
+)
+VELS = list(range(-9, 11))
+
+
+def _expected(x0, y0, vel, y1):
+    """
+    State index of the original bucketed values. Values get_state can produce (x0 > -50, y in [-360, 600)) are
+    inside the bins and must be exact, beyond those encode_state uses the edge bins.
+    """
+    values = _bucket(x0, y0, vel, y1)
+    state = encode_state(*values)
+    if x0 > -50 and all(-360 <= y < 600 for y in (y0, y1)) and -9 <= vel <= 10:
+        assert decode_state(state) == values, values
+    return state
+
+
+def test_x0_bins_match_original():
+    for x0 in X_VALUES:
+        assert discretize_state(x0, 7, 0, -3) == _expected(x0, 7, 0, -3), x0
+
+
+@pytest.mark.parametrize("position", [0, 1])
+def test_y_bins_match_original(position):
+    for y in Y_VALUES:
+        raw = (-45, y, 2, 33) if position == 0 else (-45, 33, 2, y)
+        assert discretize_state(*raw) == _expected(*raw), raw
+
+
+def test_velocity_bins_match_original():
+    for vel in VELS:
+        assert discretize_state(60, 10, vel, 0) == _expected(60, 10, vel, 0), vel
+
+
+def test_batched_matches_scalar_and_original():
+    rng = np.random.default_rng(0)
+    n = 20000
+    x0 = rng.choice(X_VALUES, n)
+    y0 = rng.choice(Y_VALUES, n)
+    vel = rng.choice(VELS, n)
+    y1 = rng.choice(Y_VALUES, n)
+    states = discretize_states(x0, y0, vel, y1)
+    assert states.dtype == np.int64
+    for i in range(n):
+        raw = (x0[i].item(), y0[i].item(), vel[i].item(), y1[i].item())
+        assert states[i] == discretize_state(*raw) == _expected(*raw), raw
+
+
+def test_shared_update_keeps_concurrent_writes():
+    rng = np.random.default_rng(0)
+    n = 200
+    states = rng.choice(50, n)
+    actions = rng.integers(0, 2, n)
+    new_states = np.where(rng.random(n) < 0.5, rng.choice(50, n), rng.choice(np.arange(100, 150), n))
+    rewards = np.where(rng.random(n) < 0.1, -1000.0, 0.0)
+    updated = set(zip(states.tolist(), actions.tolist()))
+    table, shared = QTable(), SharedQTable()
+    try:
+        table.q[:150] = shared.q[:150] = rng.standard_normal((150, 2))
+        table.update_backward(states, actions, new_states, rewards, 0.7, 0.95)
+
+        # Another process writes to every Q-value while this one updates, after the values it needs are read
+        backward_values = shared._backward_values
+
+        def concurrent(*args):
+            result = backward_values(*args)
+            shared.q[:150] = 12345.0
+            return result
+
+        shared._backward_values = concurrent
+        shared.update_backward(states, actions, new_states, rewards, 0.7, 0.95)
+        for state in range(150):
+            for action in range(2):
+                expected = table.q[state, action] if (state, action) in updated else 12345.0
+                assert shared.q[state, action] == expected, (state, action)
+    finally:
+        shared.close()
+        shared.unlink()
@@ -0,0 +1,89 @@
+"""Scenario bank: index, deduplication and capacity."""
+import random
+
+import pytest
+
+from pipes import PipeRing
+from scenario_bank import SCENARIO_HEADER, SCENARIO_INDEX, SCENARIO_RECORD, ScenarioBank
+from snapshots import SnapshotRing
+
+
+def _history(seed, frames=30):
+    """Snapshots of a bird falling past pipes that spawn on the way, different for every seed."""
+    rng = random.Random(seed)
+    pipes = PipeRing()
+    pipes.append(300, rng.randrange(-300, -100), rng.randrange(200, 400))
+    history = SnapshotRing(70)
+    y = rng.randrange(100, 300)
+    for frame in range(frames):
+        if frame == 10:
+            pipes.append(pipes.getX(pipes.count - 1) + 144, rng.randrange(-300, -100), rng.randrange(200, 400))
+        pipes.scroll(-4)
+        history.append(57, y + frame, frame % 10 - 5, pipes, seed, frame % 3)
+    return history
+
+
+@pytest.fixture
+def bank(tmp_path):
+    bank = ScenarioBank(str(tmp_path / "scenarios.bin"), capacity=4)
+    yield bank
+    bank.close()
+
+
+def test_add_and_restore(bank):
+    history = _history(1)
+    i = bank.add(history)
+    pipes = PipeRing()
+    player, score, spawns = bank.restore(i, pipes)
+    expected = PipeRing()
+    assert player == history.restore(0, expected)
+    assert score == history.score(-1)
+    assert spawns == history.spawns(0) and len(spawns) == 1
+    assert list(pipes.xs) == list(expected.xs) and list(pipes.upperYs) == list(expected.upperYs)
+
+
+def test_duplicate_counts_a_death(bank):
+    assert [bank.add(_history(seed)) for seed in (1, 2, 1, 1)] == [0, 1, 0, 0]
+    assert len(bank) == 2
+    with bank._lock(shared=True):
+        assert bank._index()["deaths"].tolist() == [3, 1]
+
+
+def test_full_bank_replaces_most_passed(bank, tmp_path):
+    for seed in range(4):
+        bank.add(_history(seed))
+    for _ in range(3):
+        bank.record_pass(2)
+    bank.record_pass(1)
+    assert bank.add(_history(10)) == 2
+    assert len(bank) == 4
+    with bank._lock(shared=True):
+        index = bank._index()
+    assert index["deaths"].tolist() == [1, 1, 1, 1] and index["passes"].tolist() == [0, 1, 0, 0]
+    assert bank.restore(2, PipeRing())[1] == 10
+
+    # The records follow the index of every scenario, the file does not grow once the bank is full
+    path = tmp_path / "scenarios.bin"
+    assert path.stat().st_size == SCENARIO_HEADER.size + 4 * (SCENARIO_INDEX.itemsize + SCENARIO_RECORD.size)
+    reopened = ScenarioBank(str(path), capacity=100)
+    assert reopened.capacity == 4 and len(reopened) == 4
+    reopened.close()
+
+
+def test_sample_weights(bank):
+    for seed in range(3):
+        bank.add(_history(seed))
+    for _ in range(5):
+        bank.record_death(1)
+    for _ in range(9):
+        bank.record_pass(2)
+    counts = [0, 0, 0]
+    rng = random.Random(0)
+    for _ in range(3000):
+        counts[bank.sample(rng)] += 1
+    # weights 1, 6 and 0.1
+    assert counts[1] > 4 * counts[0] > 16 * counts[2]
+
+
+def test_empty_bank_samples_none(bank):
+    assert bank.sample() is None
@@ -0,0 +1,92 @@
+"""
+Append-only JSON Lines log of finished training episodes.
+
+Each finished episode is one record of its episode number, score, best score so far, learning rate, frames
+played and wall time, appended and flushed as the episode ends. Saving never rewrites earlier episodes, a crash
+loses at most the episode being written, and resuming only needs the last record.
+"""
+import json
+import os
+
+
+class TrainingLog:
+    """
+    Appends episode records to a JSON Lines file, opened on the first append. Without a path records are kept in
+    memory until drained, for workers that send their episodes to another process to log.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the log, created if it does not exist, None to keep records in memory
+        """
+        self.path = path
+        self.file = None
+        self.records = []  # records appended since the last drain, only used without a path
+
+    def append(self, record):
+        """
+        Append a record and flush it to the file.
+        :param record: json serializable dict
+        """
+        if self.path is None:
+            self.records.append(record)
+            return
+        if self.file is None:
+            # A crash mid write leaves a partial last line, start the next record on a new line
+            partial = False
+            if os.path.exists(self.path) and os.path.getsize(self.path):
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    partial = f.read(1) != b"\n"
+            self.file = open(self.path, "a")
+            if partial:
+                self.file.write("\n")
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def drain(self):
+        """Returns the records kept in memory and removes them from the log."""
+        records, self.records = self.records, []
+        return records
+
+    def close(self):
+        """Close the file, the next append opens it again."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def iter_records(path):
+    """Yields the records of a log one line at a time, skipping partial lines left by a crash."""
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def read_last(path, chunk_size=4096):
+    """
+    Returns the last complete record of a log by reading back from the end of the file, or None if there is none.
+    :param path: path of the log
+    :param chunk_size: bytes read per step back from the end
+    """
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        while pos > 0:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            lines = data.split(b"\n")
+            # The first line may continue before pos, it is only complete once the start of the file is read
+            for line in reversed(lines if pos == 0 else lines[1:]):
+                if line.strip():
+                    try:
+                        return json.loads(line)
+                    except ValueError:
+                        continue
+            data = lines[0]
+    return None
@@ -0,0 +1,212 @@
+"""
+Batched headless FlappyGame: many games stepped in lockstep with their state in NumPy arrays.
+
+Every game must stay frame for frame identical to environment.FlappyGame given the same actions and pipe gaps,
+any change to the rules of one has to be made to the other.
+"""
+import numpy as np
+
+from environment import (
+    FlappyGame,
+    SCREENWIDTH,
+    SCREENHEIGHT,
+    PIPEGAPSIZE,
+    BASEY,
+    STATE_FEATURES,
+)
+from pipes import PIPE_CAPACITY
+
+
+class VectorFlappyEnv:
+    """
+    N independent Flappy Bird games stepped in lockstep.
+
+    Player and pipe state is held in NumPy arrays and every rule of FlappyGame.frame_step (gravity,
+    flap, pipe scrolling, spawning, scoring and pixel perfect crashes) is applied to all games at once.
+    Games that crash are reset in place, like FlappyGame.frame_step.
+    """
+
+    def __init__(self, num_envs, seed=None, game=None):
+        """
+        Initialise the batch of games.
+        :param num_envs: number of games to run
+        :param seed: seed for the pipe gap generator
+        :param game: FlappyGame to take sprite sizes and hitmasks from, a headless one is made by default
+        """
+        if game is None:
+            game = FlappyGame(headless=True)
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+
+        self.playerx = int(SCREENWIDTH * 0.2)
+        self.playerW = game.IMAGES["player"][0].get_width()
+        self.playerH = game.IMAGES["player"][0].get_height()
+        self.pipeW = game.IMAGES["pipe"][0].get_width()
+        self.pipeH = game.IMAGES["pipe"][0].get_height()
+
+        self.pipeVelX = -4
+        self.playerMaxVelY = 10
+        self.playerAccY = 1
+        self.playerFlapAcc = -9
+
+        # Collision only depends on the pipe offset from the player, FlappyGame uses player frame 0
+        self.collideUpper, self.collideLower = [
+            np.frombuffer(table.table, dtype=np.uint8)
+            .reshape(table.width, table.height)
+            .astype(bool)
+            for table in game.COLLISIONS[0]
+        ]
+
+        self.playery = np.zeros(num_envs, dtype=np.float64)
+        self.playerVelY = np.zeros(num_envs, dtype=np.int64)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+        self.final_score = np.zeros(num_envs, dtype=np.int64)  # score of the last crashed game
+        self.pipeX = np.zeros((num_envs, PIPE_CAPACITY), dtype=np.float64)
+        self.upperY = np.zeros((num_envs, PIPE_CAPACITY), dtype=np.int64)
+        self.lowerY = np.zeros((num_envs, PIPE_CAPACITY), dtype=np.int64)
+        self.pipeCount = np.zeros(num_envs, dtype=np.int64)
+        self._rows = np.arange(num_envs)
+        self._slots = np.arange(PIPE_CAPACITY)
+        self.reset()
+
+    def reset(self, mask=None, out=None):
+        """
+        Reset games to their starting positions.
+        :param mask: bool array of games to reset, all games by default
+        :param out: optional matrix to write the observations to, see observe
+        :return: observation matrix of shape (num_envs, len(STATE_FEATURES))
+        """
+        self._reset(self._rows if mask is None else np.flatnonzero(mask))
+        return self.observe(out)
+
+    def _reset(self, rows):
+        """Reset the games at the given row indices."""
+        self.score[rows] = 0
+        self.playery[rows] = int((SCREENHEIGHT - self.playerH) / 2)
+        self.playerVelY[rows] = -9
+        self.pipeX[rows] = 0
+        self.pipeX[rows, 0] = SCREENWIDTH + 200
+        self.pipeX[rows, 1] = SCREENWIDTH + 200 + (SCREENWIDTH / 2)
+        for slot in (0, 1):
+            gapY = self._randomGapY(len(rows))
+            self.upperY[rows, slot] = gapY - self.pipeH
+            self.lowerY[rows, slot] = gapY + PIPEGAPSIZE
+        self.pipeCount[rows] = 2
+
+    def _randomGapY(self, count):
+        """Y of the gap for count new pipes, same distribution as FlappyGame._getRandomPipe."""
+        gapY = self.rng.integers(0, int(BASEY * 0.6 - PIPEGAPSIZE), size=count)
+        return gapY + int(BASEY * 0.2)
+
+    def observe(self, out=None):
+        """
+        Observation matrix, one row per game with the columns of STATE_FEATURES.
+        :param out: optional preallocated (num_envs, len(STATE_FEATURES)) matrix to write to
+        :return: out, or a new float64 matrix if out is None
+        """
+        if out is None:
+            out = np.empty((self.num_envs, len(STATE_FEATURES)), dtype=np.float64)
+        pipe_ind = (
+            (self.pipeCount > 1) & (self.playerx > self.pipeX[:, 0] + self.pipeW)
+        ).astype(np.int64)
+        out[:, 0] = self.playery
+        out[:, 1] = self.playerVelY
+        out[:, 2] = self.pipeX[self._rows, pipe_ind] - self.playerx
+        out[:, 3] = self.upperY[self._rows, pipe_ind]
+        out[:, 4] = self.lowerY[self._rows, pipe_ind]
+        return out
+
+    def step(self, actions, out=None):
+        """
+        Advance every game by one frame.
+        :param actions: array of actions, 0 for do nothing, 1 for flap
+        :param out: optional matrix to write the observations to, see observe
+        :return: (states, rewards, dones) arrays, crashed games are reset
+        """
+        actions = np.asarray(actions)
+        active = self._slots < self.pipeCount[:, None]
+
+        # Flap
+        flapped = (actions == 1) & (self.playery > -2 * self.playerH)
+        self.playerVelY[flapped] = self.playerFlapAcc
+
+        # Check for score
+        playerMidPos = self.playerx + self.playerW / 2
+        pipeMidPos = self.pipeX + self.pipeW / 2
+        passed = active & (pipeMidPos <= playerMidPos) & (playerMidPos < pipeMidPos + 4)
+        scored = passed.sum(axis=1)
+        self.score += scored
+        rewards = np.where(scored > 0, 1.0, 0.1)
+
+        # Player's movement
+        falling = (self.playerVelY < self.playerMaxVelY) & ~flapped
+        self.playerVelY[falling] += self.playerAccY
+        self.playery += np.minimum(
+            self.playerVelY, BASEY - self.playery - self.playerH
+        )
+
+        # Move pipes to left
+        self.pipeX += self.pipeVelX
+
+        # Add new pipe
+        add = np.flatnonzero((0 < self.pipeX[:, 0]) & (self.pipeX[:, 0] < 5))
+        if len(add):
+            slot = self.pipeCount[add]
+            gapY = self._randomGapY(len(add))
+            self.pipeX[add, slot] = SCREENWIDTH + 10
+            self.upperY[add, slot] = gapY - self.pipeH
+            self.lowerY[add, slot] = gapY + PIPEGAPSIZE
+            self.pipeCount[add] += 1
+
+        # Remove old pipe
+        remove = np.flatnonzero(self.pipeX[:, 0] < -self.pipeW)
+        if len(remove):
+            for arr in (self.pipeX, self.upperY, self.lowerY):
+                arr[remove, :-1] = arr[remove, 1:]
+            self.pipeCount[remove] -= 1
+
+        # Check for crash, pipe rects are truncated like pygame.Rect does
+        dones = self.playery + self.playerH >= BASEY - 1
+        active = self._slots < self.pipeCount[:, None]
+        dx = self.pipeX.astype(np.int64) - self.playerx
+        playery = self.playery.astype(np.int64)[:, None]
+        for pipeY, table in (
+            (self.upperY, self.collideUpper),
+            (self.lowerY, self.collideLower),
+        ):
+            ix = dx + self.pipeW - 1
+            iy = pipeY - playery + self.pipeH - 1
+            inside = (
+                active
+                & (ix >= 0)
+                & (ix < table.shape[0])
+                & (iy >= 0)
+                & (iy < table.shape[1])
+            )
+            rows, slots = np.nonzero(inside)
+            hit = table[ix[rows, slots], iy[rows, slots]]
+            dones[rows[hit]] = True
+
+        rewards[dones] = -1
+        if dones.any():
+            self.final_score[dones] = self.score[dones]
+            self._reset(np.flatnonzero(dones))
+        return self.observe(out), rewards, dones
+
+
+if __name__ == "__main__":
+    import time
+
+    env = VectorFlappyEnv(4096, seed=0)
+    rng = np.random.default_rng(1)
+    steps = 1000
+    actions = (rng.random((steps, env.num_envs)) < 0.08).astype(np.int64)
+    states = env.reset()
+    start = time.time()
+    for t in range(steps):
+        env.step(actions[t], out=states)
+    elapsed = time.time() - start
+    print(
+        f"{steps * env.num_envs / elapsed / 1000:,.0f} environment steps per ms "
+        f"with {env.num_envs} games"
+    )